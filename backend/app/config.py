@@ -77,6 +77,8 @@ class Settings(BaseSettings):
     QWEN_MODEL: str = "qwen-turbo"
     QWEN_MAX_TOKENS: int = 2000
     QWEN_TEMPERATURE: float = 0.7
+    QWEN_MAX_CONCURRENCY: int = 8  # 同时进行的请求上限，按通义千问QPS配额调整
+    QWEN_RESPONSE_CACHE_TTL: int = 0  # 相同对话的响应缓存时间（秒），0表示关闭
     
     # OpenAI配置（可选）
     OPENAI_API_KEY: Optional[str] = None
@@ -299,6 +301,7 @@ JWT_REFRESH_TOKEN_EXPIRE_DAYS=7
 # AI服务配置
 QWEN_API_KEY=your_qwen_api_key
 QWEN_MODEL=qwen-turbo
+QWEN_MAX_CONCURRENCY=8
 
 # 可选AI服务
 # OPENAI_API_KEY=your_openai_api_key
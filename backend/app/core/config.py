@@ -79,6 +79,8 @@ class Settings(BaseSettings):
     # Redis缓存配置(可选)
     REDIS_URL: Optional[str] = None
     CACHE_TTL: int = 3600
+    # 未配置Redis时是否启用进程内对话上下文缓存，仅适用于单进程部署
+    LOCAL_CONTEXT_CACHE: bool = False
     
     # 文件上传配置
     MAX_FILE_SIZE: int = 10485760  # 10MB
@@ -94,31 +96,26 @@ class Settings(BaseSettings):
         解析CORS允许的源地址
         
         Args:
-            v: 原始值，可能是字符串或列表
+            v: 原始值，可能是逗号分隔的字符串、JSON数组字符串或列表
             
         Returns:
-            List[str]: 解析后的源地址列表
+            str: 逗号分隔的源地址，由get_allowed_origins_list拆分
         """
-        # 如果已经是列表，直接返回
-        if isinstance(v, list):
-            return v
-            
-        # 如果是字符串，尝试解析
+        # 如果是字符串，尝试按JSON数组解析
         if isinstance(v, str):
-            # 尝试解析为JSON
             try:
                 import json
                 parsed = json.loads(v)
                 if isinstance(parsed, list):
-                    return parsed
+                    v = parsed
             except (json.JSONDecodeError, TypeError):
                 pass
-                
-            # 尝试按逗号分隔
-            return [origin.strip() for origin in v.split(",")]
-            
-        # 默认返回空列表
-        return []
+        
+        # 列表统一转为逗号分隔的字符串，与字段类型保持一致
+        if isinstance(v, list):
+            return ",".join(str(origin).strip() for origin in v)
+        
+        return v
     
     @field_validator("ALLOWED_METHODS", mode="before")
     @classmethod
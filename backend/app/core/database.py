@@ -11,7 +11,7 @@ ChatGalaxy 数据库连接模块
 """
 
 import asyncio
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from supabase import create_client, Client
 from supabase.lib.client_options import ClientOptions
 import logging
@@ -22,6 +22,20 @@ from .config import settings
 logger = logging.getLogger(__name__)
 
 
+def _quote_filter_value(value: Any) -> str:
+    """
+    为PostgREST逻辑过滤条件中的值加双引号，避免邮箱中的"."等保留字符破坏语法
+    
+    Args:
+        value: 过滤值
+        
+    Returns:
+        str: 加引号并转义后的值
+    """
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
 class DatabaseManager:
     """
     数据库管理器
@@ -132,7 +146,7 @@ class DatabaseManager:
         Args:
             table: 表名
             operation: 操作类型 (select, insert, update, delete)
-            **kwargs: 查询参数
+            **kwargs: 查询参数 (select支持in_filters多值条件、or_filters任一相等条件、order排序和offset分页，update支持not_filters排除条件)
             
         Returns:
             Dict[str, Any]: 查询结果
@@ -144,37 +158,56 @@ class DatabaseManager:
             table_ref = self._client.table(table)
             
             if operation == "select":
-                query = table_ref.select(kwargs.get('columns', '*'))
+                columns = kwargs.get('columns') or '*'
+                if not isinstance(columns, str):
+                    columns = ",".join(columns)
+                query = table_ref.select(columns)
                 if 'filter' in kwargs:
                     for key, value in kwargs['filter'].items():
                         query = query.eq(key, value)
-                if 'limit' in kwargs:
-                    query = query.limit(kwargs['limit'])
-                if 'order' in kwargs:
-                    query = query.order(kwargs['order'])
-                
-                result = query.execute()
+                if kwargs.get('in_filters'):
+                    for key, values in kwargs['in_filters'].items():
+                        query = query.in_(key, list(values))
+                if kwargs.get('or_filters'):
+                    query = query.or_(",".join(
+                        f"{key}.eq.{_quote_filter_value(value)}"
+                        for key, value in kwargs['or_filters'].items()
+                    ))
+                if kwargs.get('order'):
+                    # 支持"列名 DESC"形式的排序
+                    column, _, direction = kwargs['order'].partition(" ")
+                    query = query.order(column, desc=direction.strip().upper() == "DESC")
+                limit = kwargs.get('limit')
+                offset = kwargs.get('offset') or 0
+                if limit is not None:
+                    query = query.range(offset, offset + limit - 1)
+                elif offset:
+                    query = query.offset(offset)
                 
             elif operation == "insert":
-                result = table_ref.insert(kwargs.get('data', {})).execute()
+                query = table_ref.insert(kwargs.get('data', {}))
                 
             elif operation == "update":
                 query = table_ref.update(kwargs.get('data', {}))
                 if 'filter' in kwargs:
                     for key, value in kwargs['filter'].items():
                         query = query.eq(key, value)
-                result = query.execute()
+                if kwargs.get('not_filters'):
+                    for key, value in kwargs['not_filters'].items():
+                        query = query.neq(key, value)
                 
             elif operation == "delete":
                 query = table_ref.delete()
                 if 'filter' in kwargs:
                     for key, value in kwargs['filter'].items():
                         query = query.eq(key, value)
-                result = query.execute()
                 
             else:
                 raise ValueError(f"不支持的操作类型: {operation}")
             
+            # 同步客户端的请求放到线程池执行，避免阻塞事件循环，并发请求可共用HTTP连接池
+            result = await asyncio.to_thread(query.execute)
+            
             return {
                 "success": True,
                 "data": result.data,
@@ -189,6 +222,156 @@ class DatabaseManager:
                 "data": None
             }
 
+    
+    async def select(
+        self,
+        table: str,
+        filters: Optional[Dict[str, Any]] = None,
+        columns: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        order_by: Optional[str] = None,
+        offset: Optional[int] = None,
+        in_filters: Optional[Dict[str, List[Any]]] = None,
+        or_filters: Optional[Dict[str, Any]] = None,
+        raise_on_error: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        查询数据
+        
+        Args:
+            table: 表名
+            filters: 相等条件
+            columns: 查询字段，默认全部
+            limit: 数量限制
+            order_by: 排序，如"created_at DESC"
+            offset: 跳过数量
+            in_filters: 多值条件，{字段: 取值列表}
+            or_filters: 任一相等条件，{字段: 值}
+            raise_on_error: 查询失败时抛出异常而非返回空列表，用于需区分"无数据"与"查询失败"的读取
+            
+        Returns:
+            List[Dict[str, Any]]: 查询结果，失败时为空列表
+            
+        Raises:
+            Exception: raise_on_error为True且查询失败
+        """
+        result = await self.execute_query(
+            table, "select",
+            filter=filters or {},
+            columns=columns,
+            limit=limit,
+            order=order_by,
+            offset=offset,
+            in_filters=in_filters,
+            or_filters=or_filters
+        )
+        if not result["success"]:
+            if raise_on_error:
+                raise Exception(f"数据库查询失败: {result['error']}")
+            return []
+        return result["data"] or []
+    
+    async def insert(self, table: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        插入数据
+        
+        Args:
+            table: 表名
+            data: 待插入的数据
+            
+        Returns:
+            List[Dict[str, Any]]: 插入的数据行，失败时为空列表
+        """
+        result = await self.execute_query(table, "insert", data=data)
+        return (result["data"] or []) if result["success"] else []
+    
+    async def update(
+        self,
+        table: str,
+        data: Dict[str, Any],
+        filters: Dict[str, Any],
+        not_filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        更新数据
+        
+        Args:
+            table: 表名
+            data: 更新的字段
+            filters: 相等条件
+            not_filters: 排除条件，{字段: 需排除的值}
+            
+        Returns:
+            List[Dict[str, Any]]: 更新的数据行，失败时为空列表
+        """
+        result = await self.execute_query(
+            table, "update",
+            data=data,
+            filter=filters,
+            not_filters=not_filters
+        )
+        return (result["data"] or []) if result["success"] else []
+    
+    async def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        删除数据
+        
+        Args:
+            table: 表名
+            filters: 相等条件
+            
+        Returns:
+            List[Dict[str, Any]]: 删除的数据行，失败时为空列表
+        """
+        result = await self.execute_query(table, "delete", filter=filters)
+        return (result["data"] or []) if result["success"] else []
+    
+    async def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量插入数据（单条INSERT语句）
+        
+        Args:
+            table: 表名
+            rows: 待插入的数据行
+            
+        Returns:
+            Dict[str, Any]: 插入结果
+        """
+        if not rows:
+            return {"success": True, "data": [], "count": 0}
+        
+        return await self.execute_query(table, "insert", data=rows)
+    
+    async def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        调用数据库函数
+        
+        Args:
+            function: 函数名
+            params: 函数参数
+            
+        Returns:
+            Dict[str, Any]: 调用结果
+        """
+        try:
+            if not self._client:
+                raise Exception("数据库未连接")
+            
+            result = await asyncio.to_thread(self._client.rpc(function, params or {}).execute)
+            
+            return {
+                "success": True,
+                "data": result.data
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ 数据库函数调用失败: {function} - {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
+
 
 # 全局数据库管理器实例
 db_manager = DatabaseManager()
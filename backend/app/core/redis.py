@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ChatGalaxy Redis连接模块
+
+管理可选的Redis键值存储连接:
+- 未配置REDIS_URL或未安装redis时不启用
+- 全局共享的异步客户端
+- 应用关闭时释放连接
+"""
+
+import logging
+from typing import Optional
+
+from .config import settings
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # redis为可选依赖
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# 全局Redis客户端实例
+_redis_client: Optional["aioredis.Redis"] = None
+
+
+def get_redis() -> Optional["aioredis.Redis"]:
+    """
+    获取Redis客户端实例
+    
+    客户端在首次执行命令时才建立连接
+    
+    Returns:
+        Optional[aioredis.Redis]: Redis客户端，未启用时返回None
+    """
+    global _redis_client
+    
+    if _redis_client is None and aioredis is not None and settings.REDIS_URL:
+        _redis_client = aioredis.from_url(settings.REDIS_URL)
+        logger.info("✅ Redis客户端已创建")
+    
+    return _redis_client
+
+
+async def close_redis():
+    """
+    关闭Redis连接
+    """
+    global _redis_client
+    
+    if _redis_client is not None:
+        await _redis_client.close()
+        _redis_client = None
+        logger.info("✅ Redis连接已关闭")
@@ -10,8 +10,16 @@ ChatGalaxy 安全认证模块
 - 权限验证装饰器
 """
 
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
 import jwt
 import bcrypt
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, status, Depends
@@ -20,6 +28,32 @@ from loguru import logger
 
 from .config import settings
 
+# 密码哈希线程池，bcrypt计算期间释放GIL，可按CPU核数并行
+_password_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="password-hash"
+)
+
+# 可直接以HMAC签名的JWT算法
+_HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+def _b64url(data: bytes) -> bytes:
+    """
+    无填充的base64url编码
+    
+    Args:
+        data: 原始字节
+        
+    Returns:
+        bytes: 编码结果
+    """
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
 
 class SecurityManager:
     """
@@ -33,9 +67,14 @@ class SecurityManager:
         初始化安全管理器
         """
         self.secret_key = settings.SECRET_KEY
-        self.algorithm = settings.JWT_ALGORITHM
-        self.access_token_expire = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
-        self.refresh_token_expire = settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS
+        self.algorithm = settings.ALGORITHM
+        self.access_token_expire = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+        self.refresh_token_expire = settings.REFRESH_TOKEN_EXPIRE_DAYS
+        
+        # HMAC算法下预先编码固定的JWT头部
+        self._signing_key = self.secret_key.encode()
+        self._digest = _HMAC_DIGESTS.get(self.algorithm)
+        self._encoded_header = _b64url(orjson.dumps({"alg": self.algorithm, "typ": "JWT"})) + b"."
     
     def create_access_token(
         self, 
@@ -214,18 +253,80 @@ class SecurityManager:
             logger.error(f"❌ 密码验证异常: {str(e)}")
             return False
     
+    async def hash_password_async(self, password: str) -> str:
+        """
+        在线程池中加密密码，避免阻塞事件循环
+        
+        Args:
+            password: 明文密码
+            
+        Returns:
+            str: 加密后的密码哈希
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, self.hash_password, password)
+    
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        在线程池中验证密码，避免阻塞事件循环
+        
+        Args:
+            plain_password: 明文密码
+            hashed_password: 加密后的密码哈希
+            
+        Returns:
+            bool: 密码是否匹配
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _password_executor, self.verify_password, plain_password, hashed_password
+        )
+    
+    def _encode_jwt(self, payload: Dict[str, Any]) -> str:
+        """
+        编码并签名JWT
+        
+        HMAC算法下复用预编码的头部并用orjson序列化载荷，其余算法交由jwt库处理
+        
+        Args:
+            payload: 令牌载荷，时间字段须为Unix时间戳
+            
+        Returns:
+            str: JWT令牌
+        """
+        if self._digest is None:
+            return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
+        
+        signing_input = self._encoded_header + _b64url(orjson.dumps(payload))
+        signature = hmac.new(self._signing_key, signing_input, self._digest).digest()
+        return (signing_input + b"." + _b64url(signature)).decode()
+    
     def create_token_pair(self, user_data: Dict[str, Any]) -> Dict[str, str]:
         """
         创建令牌对(访问令牌+刷新令牌)
         
+        刷新令牌仅携带sub，其余用户数据只写入访问令牌
+        
         Args:
-            user_data: 用户数据
+            user_data: 用户数据，须包含sub
             
         Returns:
             Dict[str, str]: 包含访问令牌和刷新令牌的字典
         """
-        access_token = self.create_access_token(user_data)
-        refresh_token = self.create_refresh_token(user_data)
+        now = int(time.time())
+        
+        access_token = self._encode_jwt({
+            **user_data,
+            "exp": now + self.access_token_expire * 60,
+            "iat": now,
+            "type": "access"
+        })
+        refresh_token = self._encode_jwt({
+            "sub": user_data["sub"],
+            "exp": now + self.refresh_token_expire * 86400,
+            "iat": now,
+            "type": "refresh"
+        })
         
         logger.info(f"🎫 创建令牌对: 用户={user_data.get('sub')}")
         
@@ -26,7 +26,12 @@ from .core.config import get_settings
 from .utils.logger import get_logger, log_request, log_error
 from .utils.response import error_response
 from .core.database import get_database_manager
-from .services.ai_client import get_ai_client, close_ai_client
+from .services.ai_client import get_ai_client, close_ai_client, close_http_client
+from .core.redis import close_redis
+from .services.chat_service import flush_finalize_tasks
+from .services.message_writer import close_message_writer
+from .services.session_stats import close_session_stats_buffer
+from .services.user_service import flush_last_login_updates
 
 # 导入API路由
 from .api.auth import router as auth_router
@@ -76,8 +81,18 @@ async def lifespan(app: FastAPI):
     try:
         # 关闭AI客户端
         await close_ai_client()
+        await close_http_client()
         logger.info("AI客户端已关闭")
         
+        # 先等流式响应保存任务把消息和统计交给写入队列，再写完排队中的消息、会话统计和登录时间
+        await flush_finalize_tasks()
+        await close_message_writer()
+        await close_session_stats_buffer()
+        await flush_last_login_updates()
+        
+        # 关闭Redis连接
+        await close_redis()
+        
         # 关闭数据库连接
         db_manager = get_database_manager()
         await db_manager.close()
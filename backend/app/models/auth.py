@@ -13,18 +13,45 @@ ChatGalaxy 认证数据模型
 """
 
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, Field, EmailStr, validator
+from typing import Annotated, Optional
+from pydantic import AfterValidator, BaseModel, Field, constr, validator
 from uuid import UUID
 
 
+# 邮箱格式，由pydantic-core的正则引擎校验，不经过email-validator
+EMAIL_PATTERN = r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$"
+
+
+def normalize_email(value: str) -> str:
+    """
+    规范化邮箱地址
+    
+    域名部分转为小写，与注册时EmailStr保存的形式一致，
+    登录、注册和密码重置都按存储形式查询
+    
+    Args:
+        value: 已通过格式校验的邮箱地址
+        
+    Returns:
+        str: 规范化后的邮箱地址
+    """
+    local_part, _, domain = value.rpartition("@")
+    return f"{local_part}@{domain.lower()}"
+
+
+EmailAddress = Annotated[
+    constr(strip_whitespace=True, max_length=254, pattern=EMAIL_PATTERN),
+    AfterValidator(normalize_email)
+]
+
+
 class LoginRequest(BaseModel):
     """
     登录请求模型
     
     用于用户登录验证
     """
-    email: EmailStr = Field(..., description="邮箱地址")
+    email: EmailAddress = Field(..., description="邮箱地址")
     password: str = Field(..., min_length=6, max_length=128, description="密码")
     remember_me: bool = Field(False, description="记住我")
     
@@ -53,7 +80,7 @@ class RegisterRequest(BaseModel):
     
     用于用户注册验证
     """
-    email: EmailStr = Field(..., description="邮箱地址")
+    email: EmailAddress = Field(..., description="邮箱地址")
     username: str = Field(..., min_length=3, max_length=50, description="用户名")
     password: str = Field(..., min_length=6, max_length=128, description="密码")
     confirm_password: str = Field(..., min_length=6, max_length=128, description="确认密码")
@@ -179,7 +206,7 @@ class PasswordResetRequest(BaseModel):
     
     用于请求密码重置
     """
-    email: EmailStr = Field(..., description="邮箱地址")
+    email: EmailAddress = Field(..., description="邮箱地址")
 
 
 class PasswordResetConfirm(BaseModel):
@@ -242,7 +269,7 @@ class EmailVerificationRequest(BaseModel):
     
     用于请求邮箱验证
     """
-    email: EmailStr = Field(..., description="邮箱地址")
+    email: EmailAddress = Field(..., description="邮箱地址")
 
 
 class EmailVerificationConfirm(BaseModel):
@@ -40,6 +40,7 @@ class ChatRequest(BaseModel):
     context_messages: Optional[List[Dict[str, Any]]] = Field(None, description="上下文消息")
     temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0, description="温度参数")
     max_tokens: Optional[int] = Field(2000, ge=1, le=4000, description="最大token数")
+    max_context_tokens: Optional[int] = Field(None, ge=0, le=8000, description="历史上下文token预算")
     
     # 访客模式支持
     guest_token: Optional[str] = Field(None, description="访客令牌")
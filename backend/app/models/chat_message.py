@@ -15,6 +15,11 @@ from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field, validator
 from uuid import UUID
 from enum import Enum
+import orjson
+
+
+# 消息元数据序列化后的最大字节数（按orjson输出的UTF-8字节计，非ASCII字符按实际字节数计入）
+MAX_METADATA_BYTES = 5000
 
 
 class MessageType(str, Enum):
@@ -114,10 +119,9 @@ class ChatMessageCreate(ChatMessageBase):
             Dict[str, Any]: 验证后的元数据
         """
         if v is not None:
-            # 限制元数据大小
-            import json
-            if len(json.dumps(v)) > 5000:  # 5KB限制
-                raise ValueError('消息元数据过大，最大5KB')
+            # 限制元数据序列化后的UTF-8字节数
+            if len(orjson.dumps(v)) > MAX_METADATA_BYTES:
+                raise ValueError(f'消息元数据过大，序列化后最大{MAX_METADATA_BYTES}字节')
         return v
 
 
@@ -162,10 +166,9 @@ class ChatMessageUpdate(BaseModel):
             Dict[str, Any]: 验证后的元数据
         """
         if v is not None:
-            # 限制元数据大小
-            import json
-            if len(json.dumps(v)) > 5000:  # 5KB限制
-                raise ValueError('消息元数据过大，最大5KB')
+            # 限制元数据序列化后的UTF-8字节数
+            if len(orjson.dumps(v)) > MAX_METADATA_BYTES:
+                raise ValueError(f'消息元数据过大，序列化后最大{MAX_METADATA_BYTES}字节')
         return v
 
 
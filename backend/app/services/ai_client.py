@@ -11,18 +11,77 @@ ChatGalaxy AI客户端服务模块
 """
 
 import asyncio
-import json
+import hashlib
 import time
-from typing import List, Dict, Any, Optional, AsyncGenerator
+from typing import List, Dict, Optional, AsyncGenerator, Tuple, Hashable, Union, NamedTuple
 from uuid import UUID
 import httpx
+import orjson
+import simdjson
 from pydantic import BaseModel
+from tenacity import (
+    AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+)
 import logging
 
 from ..config import get_settings
 from ..models.ai_role import AIRole
 from ..services.ai_role_service import AIRoleService
 from ..core.database import DatabaseManager
+from ..utils.cache import TTLCache
+
+
+# 允许发送给上游的消息角色
+_ALLOWED_MESSAGE_ROLES = frozenset({"user", "assistant", "system"})
+
+# 需要退避重试的上游状态码（限流和服务端错误）
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def _is_retryable_error(error: BaseException) -> bool:
+    """
+    判断异常是否为可重试的上游错误
+    
+    Args:
+        error: 捕获的异常
+        
+    Returns:
+        bool: 是否需要重试
+    """
+    return (
+        isinstance(error, httpx.HTTPStatusError)
+        and error.response.status_code in _RETRYABLE_STATUS_CODES
+    )
+
+
+# simdjson解析器（复用内部缓冲区，按需物化字段）
+_json_parser = simdjson.Parser()
+
+
+def _extract_generation_fields(body: bytes) -> Optional[Tuple[str, str, int]]:
+    """
+    从非流式响应体中提取所需字段
+    
+    只物化output.text、output.finish_reason和usage.total_tokens，
+    代理对象不会离开本函数，避免解析器复用时仍有引用
+    
+    Args:
+        body: 原始响应体
+        
+    Returns:
+        Optional[Tuple[str, str, int]]: (内容, 结束原因, token使用量)，格式错误返回None
+    """
+    doc = _json_parser.parse(body)
+    output = doc.get("output")
+    if output is None:
+        return None
+    
+    usage = doc.get("usage")
+    return (
+        output.get("text", ""),
+        output.get("finish_reason", "stop"),
+        usage.get("total_tokens", 0) if usage is not None else 0
+    )
 
 
 class AIResponse(BaseModel):
@@ -36,9 +95,11 @@ class AIResponse(BaseModel):
     response_time: float
     
 
-class StreamChunk(BaseModel):
+class StreamChunk(NamedTuple):
     """
     流式响应数据块
+    
+    每个token都会生成一个数据块，使用NamedTuple避免模型校验开销
     """
     content: str
     is_final: bool = False
@@ -53,12 +114,13 @@ class AIClient:
     提供与AI服务的交互功能
     """
     
-    def __init__(self, db: DatabaseManager):
+    def __init__(self, db: DatabaseManager, http_client: Optional[httpx.AsyncClient] = None):
         """
         初始化AI客户端
         
         Args:
             db: 数据库管理器
+            http_client: HTTP客户端（可选，默认使用共享连接池）
         """
         self.db = db
         self.settings = get_settings()
@@ -71,18 +133,44 @@ class AIClient:
         self.qwen_max_tokens = self.settings.qwen_max_tokens
         self.qwen_temperature = self.settings.qwen_temperature
         
+        # 并发控制，避免突发流量触发上游限流
+        self.qwen_max_concurrency = self.settings.QWEN_MAX_CONCURRENCY or 8
+        self._semaphore = asyncio.Semaphore(self.qwen_max_concurrency)
+        
+        # 模型和生成参数启动后不变，预先序列化请求体中除messages外的部分
+        parameters = {
+            "max_tokens": self.qwen_max_tokens,
+            "temperature": self.qwen_temperature,
+            "top_p": 0.8,
+            "repetition_penalty": 1.1
+        }
+        self._request_prefix = orjson.dumps({"model": self.qwen_model})[:-1] + b',"input":{"messages":'
+        self._request_suffixes = {
+            stream: b'},"parameters":' + orjson.dumps({**parameters, "incremental_output": stream}) + b"}"
+            for stream in (False, True)
+        }
+        
+        # 角色缓存（角色很少变更，避免每次请求都查询数据库）
+        self._role_cache = TTLCache(maxsize=1024, ttl=300)
+        
+        # 响应缓存（按角色和完整对话内容精确匹配）
+        self._response_cache = TTLCache(
+            maxsize=1024,
+            ttl=self.settings.QWEN_RESPONSE_CACHE_TTL
+        )
+        
         # API端点
         self.qwen_api_url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
         
-        # HTTP客户端
-        self.http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(60.0),
-            headers={
-                "Authorization": f"Bearer {self.qwen_api_key}",
-                "Content-Type": "application/json",
-                "X-DashScope-SSE": "enable"  # 启用流式响应
-            }
-        )
+        # 请求头（共享连接池不携带认证信息，按请求附加）
+        self._headers = {
+            "Authorization": f"Bearer {self.qwen_api_key}",
+            "Content-Type": "application/json",
+            "X-DashScope-SSE": "enable"  # 启用流式响应
+        }
+        
+        # HTTP客户端（默认使用进程级共享连接池）
+        self.http_client = http_client or get_http_client()
     
     async def generate_response(
         self,
@@ -107,44 +195,64 @@ class AIClient:
         try:
             start_time = time.time()
             
+            # 命中缓存时直接返回，跳过角色查询和上游调用
+            cache_key = self._response_cache_key(messages, ai_role_id)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                return cached.model_copy(update={"response_time": time.time() - start_time})
+            
+            # 流式请求由_stream_chunks构建请求体，并在完整结束时写入缓存
+            if stream:
+                return await self._generate_stream_response(messages, ai_role_id, start_time)
+            
             # 获取AI角色信息
-            ai_role = None
-            if ai_role_id:
-                ai_role = await self.ai_role_service.get_role_by_id(ai_role_id)
+            ai_role = await self._get_role_cached(ai_role_id) if ai_role_id else None
             
             # 构建请求消息
-            request_messages = await self._build_request_messages(messages, ai_role)
+            request_messages = self._build_request_messages(messages, ai_role)
             
-            # 构建请求参数
-            request_data = {
-                "model": self.qwen_model,
-                "input": {
-                    "messages": request_messages
-                },
-                "parameters": {
-                    "max_tokens": self.qwen_max_tokens,
-                    "temperature": self.qwen_temperature,
-                    "top_p": 0.8,
-                    "repetition_penalty": 1.1,
-                    "incremental_output": stream
-                }
-            }
+            # 构建请求体
+            request_body = self._build_request_body(request_messages, stream)
             
-            self.logger.info(f"发送AI请求: model={self.qwen_model}, messages={len(request_messages)}")
+            self.logger.info("发送AI请求: model=%s, messages=%d", self.qwen_model, len(request_messages))
             
-            if stream:
-                return await self._generate_stream_response(request_data, start_time)
-            else:
-                return await self._generate_single_response(request_data, start_time)
+            ai_response = await self._generate_single_response(request_body, start_time)
+            
+            self._store_cached_response(cache_key, ai_response)
+            return ai_response
                 
         except Exception as e:
-            self.logger.error(f"AI响应生成失败: {str(e)}")
+            self.logger.error("AI响应生成失败: %s", e)
             raise Exception(f"AI服务调用失败: {str(e)}")
     
+    async def generate_responses_batch(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        ai_role_id: Optional[UUID] = None
+    ) -> List[Union[AIResponse, BaseException]]:
+        """
+        并发生成多组对话的AI响应
+        
+        所有请求同时提交，由并发信号量控制实际在途数量
+        
+        Args:
+            messages_list: 多组对话消息列表
+            ai_role_id: AI角色ID（可选）
+            
+        Returns:
+            List[Union[AIResponse, BaseException]]: 与输入顺序一致的结果，
+                失败项为对应的异常，由调用方决定是否重试
+        """
+        return await asyncio.gather(
+            *(self.generate_response(messages, ai_role_id) for messages in messages_list),
+            return_exceptions=True
+        )
+    
     async def generate_stream_response(
         self,
         messages: List[Dict[str, str]],
-        ai_role_id: Optional[UUID] = None
+        ai_role_id: Optional[UUID] = None,
+        buffer_size: Optional[int] = None
     ) -> AsyncGenerator[StreamChunk, None]:
         """
         生成流式AI响应
@@ -152,58 +260,147 @@ class AIClient:
         Args:
             messages: 对话消息列表
             ai_role_id: AI角色ID（可选）
+            buffer_size: 预读缓冲的数据块数量（可选）。设置后上游读取在后台进行，
+                缓冲区满时暂停读取，慢速客户端不会导致数据块在内存中无限堆积
             
         Yields:
             StreamChunk: 流式响应数据块
         """
+        chunks = self._stream_chunks(messages, ai_role_id)
+        
+        if not buffer_size:
+            async for chunk in chunks:
+                yield chunk
+            return
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        pump_task = asyncio.create_task(self._pump_stream(chunks, queue))
+        
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 消费方提前退出（如客户端断开）时停止读取上游
+            if not pump_task.done():
+                pump_task.cancel()
+    
+    async def _pump_stream(
+        self,
+        chunks: AsyncGenerator[StreamChunk, None],
+        queue: asyncio.Queue
+    ) -> None:
+        """
+        将上游数据块写入有界队列
+        
+        队列满时put会阻塞，从而暂停对上游响应的读取
+        
+        Args:
+            chunks: 上游数据块生成器
+            queue: 有界队列，以None表示结束
+        """
         try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+        finally:
+            await chunks.aclose()
+        
+        await queue.put(None)
+    
+    async def _stream_chunks(
+        self,
+        messages: List[Dict[str, str]],
+        ai_role_id: Optional[UUID] = None
+    ) -> AsyncGenerator[StreamChunk, None]:
+        """
+        请求上游并逐块产出流式响应
+        
+        Args:
+            messages: 对话消息列表
+            ai_role_id: AI角色ID（可选）
+            
+        Yields:
+            StreamChunk: 流式响应数据块
+        """
+        try:
+            start_time = time.time()
+            
+            # 命中缓存时以单个内容块返回，流式调用方无需区分
+            cache_key = self._response_cache_key(messages, ai_role_id)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                yield StreamChunk(content=cached.content, is_final=False)
+                yield StreamChunk(
+                    content="",
+                    is_final=True,
+                    tokens_used=cached.tokens_used,
+                    finish_reason=cached.finish_reason
+                )
+                return
+            
             # 获取AI角色信息
-            ai_role = None
-            if ai_role_id:
-                ai_role = await self.ai_role_service.get_role_by_id(ai_role_id)
+            ai_role = await self._get_role_cached(ai_role_id) if ai_role_id else None
             
             # 构建请求消息
-            request_messages = await self._build_request_messages(messages, ai_role)
+            request_messages = self._build_request_messages(messages, ai_role)
             
-            # 构建请求参数
-            request_data = {
-                "model": self.qwen_model,
-                "input": {
-                    "messages": request_messages
-                },
-                "parameters": {
-                    "max_tokens": self.qwen_max_tokens,
-                    "temperature": self.qwen_temperature,
-                    "top_p": 0.8,
-                    "repetition_penalty": 1.1,
-                    "incremental_output": True
-                }
-            }
+            # 构建请求体
+            request_body = self._build_request_body(request_messages, True)
             
-            self.logger.info(f"发送流式AI请求: model={self.qwen_model}")
+            self.logger.info("发送流式AI请求: model=%s", self.qwen_model)
             
             # 发送流式请求
-            async with self.http_client.stream(
+            async with self._semaphore, self.http_client.stream(
                 "POST",
                 self.qwen_api_url,
-                json=request_data
+                content=request_body,
+                headers=self._headers
             ) as response:
                 if response.status_code != 200:
                     error_text = await response.aread()
                     raise Exception(f"API请求失败: {response.status_code} - {error_text.decode()}")
                 
-                full_content = ""
+                self.logger.debug("流式响应协议: %s", response.http_version)
+                
+                content_parts: List[str] = []
                 tokens_used = 0
                 finish_reason = "stop"
                 
-                async for line in response.aiter_lines():
-                    if not line.strip():
-                        continue
+                # 按字节扫描SSE流，避免逐行UTF-8解码
+                buffer = bytearray()
+                done = False
+                
+                async for raw_chunk in response.aiter_bytes():
+                    buffer.extend(raw_chunk)
                     
-                    if line.startswith("data: "):
-                        data_str = line[6:]
+                    while (newline := buffer.find(b"\n")) >= 0:
+                        # 只有data字段需要处理，空行、注释(:)和id/event/retry字段
+                        # 按行首字节直接丢弃，不复制行内容
+                        if buffer[:1] != b"d" or not buffer.startswith(b"data:"):
+                            del buffer[:newline + 1]
+                            continue
+                        
+                        start = 6 if buffer[5:6] == b" " else 5
+                        end = newline - 1 if buffer[newline - 1:newline] == b"\r" else newline
+                        payload = bytes(buffer[start:end])
+                        del buffer[:newline + 1]
+                        
+                        if not payload:
+                            continue
                         
-                        if data_str.strip() == "[DONE]":
+                        if payload == b"[DONE]":
+                            self._store_cached_response(cache_key, AIResponse.model_construct(
+                                content="".join(content_parts),
+                                model=self.qwen_model,
+                                tokens_used=tokens_used,
+                                finish_reason=finish_reason,
+                                response_time=time.time() - start_time
+                            ))
+                            
                             # 发送最终块
                             yield StreamChunk(
                                 content="",
@@ -211,45 +408,140 @@ class AIClient:
                                 tokens_used=tokens_used,
                                 finish_reason=finish_reason
                             )
+                            done = True
                             break
                         
                         try:
-                            data = json.loads(data_str)
+                            data = orjson.loads(payload)
                             
-                            if "output" in data:
-                                output = data["output"]
-                                
-                                if "text" in output:
-                                    chunk_content = output["text"]
-                                    full_content += chunk_content
+                            output = data.get("output")
+                            if output is not None:
+                                chunk_content = output.get("text")
+                                if chunk_content is not None:
+                                    content_parts.append(chunk_content)
                                     
                                     # 发送内容块
-                                    yield StreamChunk(
-                                        content=chunk_content,
-                                        is_final=False
-                                    )
+                                    yield StreamChunk(chunk_content)
                                 
-                                if "finish_reason" in output:
-                                    finish_reason = output["finish_reason"]
+                                chunk_finish_reason = output.get("finish_reason")
+                                if chunk_finish_reason is not None:
+                                    finish_reason = chunk_finish_reason
                             
-                            if "usage" in data:
-                                usage = data["usage"]
-                                if "total_tokens" in usage:
-                                    tokens_used = usage["total_tokens"]
+                            usage = data.get("usage")
+                            if usage is not None:
+                                total_tokens = usage.get("total_tokens")
+                                if total_tokens is not None:
+                                    tokens_used = total_tokens
                                     
-                        except json.JSONDecodeError as e:
-                            self.logger.warning(f"解析流式响应失败: {e}")
+                        except orjson.JSONDecodeError as e:
+                            if self.logger.isEnabledFor(logging.WARNING):
+                                self.logger.warning("解析流式响应失败: %s", e)
                             continue
+                    
+                    if done:
+                        break
                 
         except Exception as e:
-            self.logger.error(f"流式AI响应生成失败: {str(e)}")
+            self.logger.error("流式AI响应生成失败: %s", e)
             yield StreamChunk(
                 content=f"AI服务暂时不可用: {str(e)}",
                 is_final=True,
                 finish_reason="error"
             )
     
-    async def _build_request_messages(
+    def _build_request_body(
+        self,
+        request_messages: List[Dict[str, str]],
+        stream: bool = False
+    ) -> bytes:
+        """
+        构建并序列化请求体
+        
+        Args:
+            request_messages: 格式化的请求消息
+            stream: 是否使用增量输出
+            
+        Returns:
+            bytes: JSON请求体
+        """
+        return self._request_prefix + orjson.dumps(request_messages) + self._request_suffixes[stream]
+    
+    def _response_cache_key(
+        self,
+        messages: List[Dict[str, str]],
+        ai_role_id: Optional[UUID] = None
+    ) -> Tuple[Optional[str], str]:
+        """
+        计算响应缓存键
+        
+        Args:
+            messages: 对话消息列表
+            ai_role_id: AI角色ID（可选）
+            
+        Returns:
+            Tuple[Optional[str], str]: (角色ID, 对话内容摘要)
+        """
+        digest = hashlib.blake2b(
+            orjson.dumps(messages, option=orjson.OPT_SORT_KEYS),
+            digest_size=16
+        ).hexdigest()
+        return (str(ai_role_id) if ai_role_id else None, digest)
+    
+    def _get_cached_response(self, cache_key: Hashable) -> Optional[AIResponse]:
+        """
+        读取缓存的AI响应
+        
+        Args:
+            cache_key: 缓存键
+            
+        Returns:
+            Optional[AIResponse]: 缓存的响应，未命中返回None
+        """
+        if not self._response_cache.ttl:
+            return None
+        return self._response_cache.get(cache_key)
+    
+    def _store_cached_response(self, cache_key: Hashable, ai_response: AIResponse) -> None:
+        """
+        缓存完整结束的AI响应
+        
+        Args:
+            cache_key: 缓存键
+            ai_response: AI响应结果
+        """
+        if self._response_cache.ttl and ai_response.finish_reason == "stop" and ai_response.content:
+            self._response_cache.set(cache_key, ai_response)
+    
+    async def _get_role_cached(self, ai_role_id: UUID) -> Optional[AIRole]:
+        """
+        获取AI角色信息（带缓存）
+        
+        Args:
+            ai_role_id: AI角色ID
+            
+        Returns:
+            Optional[AIRole]: 角色信息，不存在则返回None
+        """
+        ai_role = self._role_cache.get(ai_role_id)
+        if ai_role is None:
+            ai_role = await self.ai_role_service.get_role_by_id(ai_role_id)
+            if ai_role is not None:
+                self._role_cache.set(ai_role_id, ai_role)
+        return ai_role
+    
+    def invalidate_role_cache(self, ai_role_id: UUID) -> None:
+        """
+        清除指定角色的角色缓存和响应缓存（角色增删改后调用）
+        
+        Args:
+            ai_role_id: AI角色ID
+        """
+        self._role_cache.invalidate(ai_role_id)
+        
+        role_key = str(ai_role_id)
+        self._response_cache.invalidate_where(lambda key: key[0] == role_key)
+    
+    def _build_request_messages(
         self,
         messages: List[Dict[str, str]],
         ai_role: Optional[AIRole] = None
@@ -264,68 +556,68 @@ class AIClient:
         Returns:
             List[Dict[str, str]]: 格式化的请求消息
         """
-        request_messages = []
-        
         # 添加系统提示（如果有AI角色）
-        if ai_role and ai_role.system_prompt:
-            request_messages.append({
-                "role": "system",
-                "content": ai_role.system_prompt
-            })
-        
-        # 添加对话消息
-        for message in messages:
-            if message.get("role") in ["user", "assistant", "system"]:
-                request_messages.append({
-                    "role": message["role"],
-                    "content": message["content"]
-                })
+        request_messages = (
+            [{"role": "system", "content": ai_role.system_prompt}]
+            if ai_role and ai_role.system_prompt else []
+        )
+        
+        # 添加对话消息，只保留接口需要的字段
+        request_messages.extend(
+            {"role": message["role"], "content": message["content"]}
+            for message in messages
+            if message.get("role") in _ALLOWED_MESSAGE_ROLES
+        )
         
         return request_messages
     
     async def _generate_single_response(
         self,
-        request_data: Dict[str, Any],
+        request_body: bytes,
         start_time: float
     ) -> AIResponse:
         """
         生成单次AI响应
         
         Args:
-            request_data: 请求数据
+            request_body: 序列化后的请求体
             start_time: 开始时间
             
         Returns:
             AIResponse: AI响应结果
         """
-        response = await self.http_client.post(
-            self.qwen_api_url,
-            json=request_data
-        )
+        # 限流和服务端错误按指数退避重试，退避期间不占用并发名额
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception(_is_retryable_error),
+            wait=wait_exponential_jitter(initial=1, max=30),
+            stop=stop_after_attempt(5),
+            reraise=True
+        ):
+            with attempt:
+                async with self._semaphore:
+                    response = await self.http_client.post(
+                        self.qwen_api_url,
+                        content=request_body,
+                        headers=self._headers
+                    )
+                
+                if response.status_code in _RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
         
         if response.status_code != 200:
             error_text = response.text
             raise Exception(f"API请求失败: {response.status_code} - {error_text}")
         
-        result = response.json()
-        
         # 解析响应
-        if "output" not in result:
+        fields = _extract_generation_fields(response.content)
+        if fields is None:
             raise Exception("API响应格式错误")
         
-        output = result["output"]
-        content = output.get("text", "")
-        finish_reason = output.get("finish_reason", "stop")
-        
-        # 获取token使用量
-        tokens_used = 0
-        if "usage" in result:
-            usage = result["usage"]
-            tokens_used = usage.get("total_tokens", 0)
+        content, finish_reason, tokens_used = fields
         
         response_time = time.time() - start_time
         
-        return AIResponse(
+        return AIResponse.model_construct(
             content=content,
             model=self.qwen_model,
             tokens_used=tokens_used,
@@ -335,24 +627,26 @@ class AIClient:
     
     async def _generate_stream_response(
         self,
-        request_data: Dict[str, Any],
+        messages: List[Dict[str, str]],
+        ai_role_id: Optional[UUID],
         start_time: float
     ) -> AIResponse:
         """
         生成流式响应（用于非流式接口）
         
         Args:
-            request_data: 请求数据
+            messages: 对话消息列表
+            ai_role_id: AI角色ID（可选）
             start_time: 开始时间
             
         Returns:
             AIResponse: AI响应结果
         """
-        full_content = ""
+        content_parts: List[str] = []
         tokens_used = 0
         finish_reason = "stop"
         
-        async for chunk in self.generate_stream_response([]):
+        async for chunk in self._stream_chunks(messages, ai_role_id):
             if chunk.is_final:
                 if chunk.tokens_used:
                     tokens_used = chunk.tokens_used
@@ -360,12 +654,12 @@ class AIClient:
                     finish_reason = chunk.finish_reason
                 break
             else:
-                full_content += chunk.content
+                content_parts.append(chunk.content)
         
         response_time = time.time() - start_time
         
-        return AIResponse(
-            content=full_content,
+        return AIResponse.model_construct(
+            content="".join(content_parts),
             model=self.qwen_model,
             tokens_used=tokens_used,
             finish_reason=finish_reason,
@@ -374,13 +668,61 @@ class AIClient:
     
     async def close(self):
         """
-        关闭HTTP客户端
+        释放AI客户端资源
+        
+        共享连接池由close_http_client统一关闭，这里只清理本实例的缓存
         """
-        await self.http_client.aclose()
+        self._role_cache.clear()
+        self._response_cache.clear()
+
+
+# 进程级共享HTTP客户端
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    获取共享HTTP客户端
+    
+    创建过程没有await，在事件循环内不会被并发调用打断
+    
+    Returns:
+        httpx.AsyncClient: 共享HTTP客户端
+    """
+    global _http_client
+    
+    if _http_client is None or _http_client.is_closed:
+        # 显式连接池，HTTP/2多路复用并发请求，连接失败自动重试
+        _http_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=50,
+                    keepalive_expiry=60
+                )
+            ),
+            timeout=httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=5.0)
+        )
+    
+    return _http_client
+
+
+async def close_http_client():
+    """
+    关闭共享HTTP客户端
+    """
+    global _http_client
+    
+    if _http_client:
+        await _http_client.aclose()
+        _http_client = None
 
 
 # 全局AI客户端实例
 _ai_client: Optional[AIClient] = None
+_ai_client_lock = asyncio.Lock()
 
 
 async def get_ai_client() -> AIClient:
@@ -392,20 +734,37 @@ async def get_ai_client() -> AIClient:
     """
     global _ai_client
     
-    if _ai_client is None:
-        from ..core.database import get_database_manager
-        db = await get_database_manager()
-        _ai_client = AIClient(db)
+    if _ai_client is not None:
+        return _ai_client
+    
+    # 加锁避免并发初始化时重复创建客户端并泄漏连接池
+    async with _ai_client_lock:
+        if _ai_client is None:
+            from ..core.database import get_database_manager
+            db = await get_database_manager()
+            _ai_client = AIClient(db)
     
     return _ai_client
 
 
+def invalidate_ai_role_cache(ai_role_id: UUID) -> None:
+    """
+    清除全局AI客户端中指定角色的缓存，客户端尚未创建时无需处理
+    
+    Args:
+        ai_role_id: AI角色ID
+    """
+    if _ai_client is not None:
+        _ai_client.invalidate_role_cache(ai_role_id)
+
+
 async def close_ai_client():
     """
     关闭AI客户端
     """
     global _ai_client
     
-    if _ai_client:
-        await _ai_client.close()
-        _ai_client = None
\ No newline at end of file
+    async with _ai_client_lock:
+        if _ai_client:
+            await _ai_client.close()
+            _ai_client = None
\ No newline at end of file
@@ -10,17 +10,117 @@ ChatGalaxy AI角色服务模块
 - 角色权限管理
 """
 
-from typing import List, Optional, Dict, Any
+import asyncio
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 from uuid import UUID, uuid4
 from datetime import datetime
 import logging
+import orjson
 
 from ..core.database import DatabaseManager
+from ..core.redis import get_redis
+from ..utils.cache import TTLCache
 from ..models.ai_role import (
     AIRole, AIRoleCreate, AIRoleUpdate, AIRoleResponse, 
     AIRoleStats, AIRoleType
 )
 
+logger = logging.getLogger(__name__)
+
+
+# 角色读缓存，在所有服务实例间共享，角色写入后失效
+_role_cache = TTLCache(maxsize=1024, ttl=60)
+
+_DEFAULT_ROLES_CACHE_KEY = ("default",)
+
+# Redis中按ID缓存的角色记录，供多个进程共享
+_ROLE_KV_PREFIX = "airole:"
+_ROLE_KV_TTL = 300
+
+# 正在进行中的按ID角色查询，供并发请求复用
+_inflight_role_loads: Dict[str, "asyncio.Future[Optional[AIRoleResponse]]"] = {}
+
+# 按ID的角色缓存代数，角色变更时递增，变更前开始的查询不再写入缓存
+_role_generations: Dict[str, int] = {}
+
+# 角色类型取值到枚举成员的映射，避免逐行调用枚举构造
+_ROLE_TYPES_BY_VALUE = {role_type.value: role_type for role_type in AIRoleType}
+
+# 列表类查询的字段，不含体积较大的system_prompt
+_ROLE_LIST_COLUMNS = [
+    "id", "name", "description", "role_type", "avatar_url", "personality",
+    "greeting_message", "is_active", "is_default", "usage_count",
+    "created_at", "updated_at"
+]
+
+
+# 预设的默认AI角色
+_DEFAULT_ROLES: Tuple[AIRoleCreate, ...] = (
+    AIRoleCreate(
+        name="智能助手",
+        description="专业的AI助手，能够回答各种问题并提供帮助",
+        role_type=AIRoleType.ASSISTANT,
+        avatar_url="/avatars/assistant.png",
+        personality="专业、友善、乐于助人",
+        system_prompt="你是一个专业的AI助手，能够回答用户的各种问题。请保持友善、专业的态度，提供准确和有用的信息。",
+        greeting_message="你好！我是你的智能助手，有什么可以帮助你的吗？",
+        is_active=True,
+        is_default=True
+    ),
+    AIRoleCreate(
+        name="创意作家",
+        description="富有创意的写作助手，擅长创作故事、诗歌和文案",
+        role_type=AIRoleType.CREATIVE,
+        avatar_url="/avatars/writer.png",
+        personality="富有想象力、文艺、充满创意",
+        system_prompt="你是一位富有创意的作家，擅长创作各种文学作品。请发挥你的想象力，创作出生动有趣的内容。",
+        greeting_message="嗨！我是你的创意伙伴，让我们一起创作出精彩的作品吧！",
+        is_active=True,
+        is_default=True
+    ),
+    AIRoleCreate(
+        name="技术专家",
+        description="专业的技术顾问，精通编程、系统架构和技术解决方案",
+        role_type=AIRoleType.TECHNICAL,
+        avatar_url="/avatars/developer.png",
+        personality="严谨、专业、逻辑清晰",
+        system_prompt="你是一位经验丰富的技术专家，精通各种编程语言和技术栈。请提供准确的技术建议和解决方案。",
+        greeting_message="你好！我是技术专家，准备好解决你的技术问题了！",
+        is_active=True,
+        is_default=True
+    ),
+    AIRoleCreate(
+        name="轻松聊天",
+        description="轻松愉快的聊天伙伴，适合日常闲聊和娱乐",
+        role_type=AIRoleType.CASUAL,
+        avatar_url="/avatars/casual.png",
+        personality="轻松、幽默、平易近人",
+        system_prompt="你是一个轻松愉快的聊天伙伴，喜欢和用户进行轻松的对话。请保持友好和幽默的态度。",
+        greeting_message="嘿！很高兴见到你，我们聊点什么有趣的吧！",
+        is_active=True,
+        is_default=True
+    ),
+)
+
+
+async def _none() -> None:
+    """
+    占位协程，用于asyncio.gather中跳过的查询
+    """
+    return None
+
+
+def _discard_inflight_load(rid: str, load: "asyncio.Future[Optional[AIRoleResponse]]") -> None:
+    """
+    查询结束后移除进行中的记录，已被新查询替换时保留新记录
+    
+    Args:
+        rid: 角色ID
+        load: 已结束的查询
+    """
+    if _inflight_role_loads.get(rid) is load:
+        del _inflight_role_loads[rid]
+
 
 class AIRoleService:
     """
@@ -29,6 +129,8 @@ class AIRoleService:
     提供AI角色管理的核心业务逻辑
     """
     
+    __slots__ = ("db", "kv")
+    
     def __init__(self, db: DatabaseManager):
         """
         初始化AI角色服务
@@ -37,7 +139,8 @@ class AIRoleService:
             db: 数据库管理器
         """
         self.db = db
-        self.logger = logging.getLogger(__name__)
+        # 可选的Redis角色缓存
+        self.kv = get_redis()
     
     async def create_role(self, role_data: AIRoleCreate) -> AIRoleResponse:
         """
@@ -61,23 +164,10 @@ class AIRoleService:
             
             # 生成角色ID
             role_id = uuid4()
+            now_iso = datetime.utcnow().isoformat()
             
             # 准备数据库数据
-            db_data = {
-                "id": str(role_id),
-                "name": role_data.name,
-                "description": role_data.description,
-                "role_type": role_data.role_type.value,
-                "avatar_url": role_data.avatar_url,
-                "personality": role_data.personality,
-                "system_prompt": role_data.system_prompt,
-                "greeting_message": role_data.greeting_message,
-                "is_active": role_data.is_active,
-                "is_default": role_data.is_default,
-                "usage_count": 0,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }
+            db_data = self._build_db_data(role_id, role_data, now_iso)
             
             # 如果设置为默认角色，先取消其他默认角色
             if role_data.is_default:
@@ -87,20 +177,19 @@ class AIRoleService:
             result = await self.db.insert("ai_roles", db_data)
             if not result:
                 raise Exception("角色创建失败")
+            await self._invalidate_cache(role_id, role_data.name)
             
-            # 获取创建的角色
-            created_role = await self.get_role_by_id(role_id)
-            if not created_role:
-                raise Exception("获取创建的角色失败")
+            # 由已写入的数据直接构造响应，无需回读
+            created_role = self._convert_to_response(db_data)
             
-            self.logger.info(f"AI角色创建成功: {role_data.name} ({role_id})")
+            logger.info("AI角色创建成功: %s (%s)", role_data.name, role_id)
             return created_role
             
         except ValueError:
             raise
         except Exception as e:
-            self.logger.error(f"AI角色创建失败: {str(e)}")
-            raise Exception(f"角色创建失败: {str(e)}")
+            logger.error("AI角色创建失败: %s", e)
+            raise
     
     async def get_role_by_id(self, role_id: UUID) -> Optional[AIRoleResponse]:
         """
@@ -112,49 +201,122 @@ class AIRoleService:
         Returns:
             Optional[AIRoleResponse]: 角色信息，不存在则返回None
         """
-        try:
+        rid = str(role_id)
+        cached_role = _role_cache.get(("id", rid))
+        if cached_role is not None:
+            return cached_role
+        
+        # 同一角色的并发查询合并为一次数据库查询
+        load = _inflight_role_loads.get(rid)
+        if load is None:
+            load = asyncio.ensure_future(self._load_role(rid))
+            _inflight_role_loads[rid] = load
+            load.add_done_callback(lambda done: _discard_inflight_load(rid, done))
+        
+        # shield避免单个调用方取消时中断其他调用方共享的查询
+        return await asyncio.shield(load)
+    
+    async def _load_role(self, rid: str) -> Optional[AIRoleResponse]:
+        """
+        从数据库加载AI角色并写入缓存
+        
+        Args:
+            rid: 角色ID
+            
+        Returns:
+            Optional[AIRoleResponse]: 角色信息，不存在则返回None
+        """
+        generation = _role_generations.get(rid, 0)
+        
+        # 先查Redis中其他进程已缓存的记录
+        role_data = await self._kv_get_role(rid)
+        from_kv = role_data is not None
+        if not from_kv:
             result = await self.db.select(
                 "ai_roles",
-                filters={"id": str(role_id)},
-                limit=1
+                filters={"id": rid},
+                limit=1,
+                raise_on_error=True
             )
             
             if not result:
                 return None
             
             role_data = result[0]
-            return self._convert_to_response(role_data)
-            
-        except Exception as e:
-            self.logger.error(f"获取AI角色失败: {str(e)}")
-            return None
+        
+        role = self._convert_to_response(role_data)
+        
+        # 查询期间角色已变更时，结果可能是旧数据，只返回不缓存
+        if _role_generations.get(rid, 0) != generation:
+            return role
+        
+        if not from_kv:
+            await self._kv_set_role(rid, role_data)
+        _role_cache.set(("id", rid), role)
+        return role
     
-    async def get_role_by_name(self, name: str) -> Optional[AIRoleResponse]:
+    async def get_roles_by_ids(self, role_ids: Iterable[UUID]) -> Dict[UUID, AIRoleResponse]:
         """
-        根据名称获取AI角色
+        批量获取AI角色
+        
+        已缓存的角色直接返回，其余角色以单次IN查询获取
         
         Args:
-            name: 角色名称
+            role_ids: 角色ID（可重复）
             
         Returns:
-            Optional[AIRoleResponse]: 角色信息，不存在则返回None
+            Dict[UUID, AIRoleResponse]: 角色ID到角色信息的映射，不含不存在的角色
         """
-        try:
+        roles = {}
+        missing_ids = []
+        for role_id in set(role_ids):
+            cached_role = _role_cache.get(("id", str(role_id)))
+            if cached_role is not None:
+                roles[role_id] = cached_role
+            else:
+                missing_ids.append(str(role_id))
+        
+        if missing_ids:
             result = await self.db.select(
                 "ai_roles",
-                filters={"name": name},
-                limit=1
+                in_filters={"id": missing_ids}
             )
+            for role_data in result:
+                role = self._convert_to_response(role_data)
+                _role_cache.set(("id", role_data["id"]), role)
+                roles[role.id] = role
+        
+        return roles
+    
+    async def get_role_by_name(self, name: str) -> Optional[AIRoleResponse]:
+        """
+        根据名称获取AI角色（不含system_prompt）
+        
+        Args:
+            name: 角色名称
             
-            if not result:
-                return None
-            
-            role_data = result[0]
-            return self._convert_to_response(role_data)
-            
-        except Exception as e:
-            self.logger.error(f"根据名称获取AI角色失败: {str(e)}")
+        Returns:
+            Optional[AIRoleResponse]: 角色信息，不存在则返回None
+        """
+        cache_key = ("name", name)
+        cached_role = _role_cache.get(cache_key)
+        if cached_role is not None:
+            return cached_role
+        
+        result = await self.db.select(
+            "ai_roles",
+            filters={"name": name},
+            columns=_ROLE_LIST_COLUMNS,
+            limit=1,
+            raise_on_error=True
+        )
+        
+        if not result:
             return None
+        
+        role = self._convert_to_response(result[0])
+        _role_cache.set(cache_key, role)
+        return role
     
     async def get_roles(
         self, 
@@ -162,7 +324,8 @@ class AIRoleService:
         is_active: Optional[bool] = None,
         is_default: Optional[bool] = None,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        columns: Optional[List[str]] = None
     ) -> List[AIRoleResponse]:
         """
         获取AI角色列表
@@ -173,41 +336,33 @@ class AIRoleService:
             is_default: 默认角色过滤
             skip: 跳过数量
             limit: 限制数量
+            columns: 查询字段，默认不含system_prompt
             
         Returns:
             List[AIRoleResponse]: 角色列表
         """
-        try:
-            # 构建过滤条件
-            filters = {}
-            if role_type is not None:
-                filters["role_type"] = role_type.value
-            if is_active is not None:
-                filters["is_active"] = is_active
-            if is_default is not None:
-                filters["is_default"] = is_default
-            
-            # 查询数据库
-            result = await self.db.select(
-                "ai_roles",
-                filters=filters,
-                order_by="created_at DESC",
-                offset=skip,
-                limit=limit
-            )
-            
-            # 转换为响应模型
-            roles = []
-            for role_data in result:
-                role_response = self._convert_to_response(role_data)
-                if role_response:
-                    roles.append(role_response)
-            
-            return roles
-            
-        except Exception as e:
-            self.logger.error(f"获取AI角色列表失败: {str(e)}")
-            return []
+        # 构建过滤条件
+        filters = {}
+        if role_type is not None:
+            filters["role_type"] = role_type.value
+        if is_active is not None:
+            filters["is_active"] = is_active
+        if is_default is not None:
+            filters["is_default"] = is_default
+        
+        # 查询数据库
+        result = await self.db.select(
+            "ai_roles",
+            filters=filters,
+            columns=columns or _ROLE_LIST_COLUMNS,
+            order_by="created_at DESC",
+            offset=skip,
+            limit=limit,
+            raise_on_error=True
+        )
+        
+        # 转换为响应模型
+        return [self._convert_to_response(role_data) for role_data in result]
     
     async def get_default_roles(self) -> List[AIRoleResponse]:
         """
@@ -216,7 +371,11 @@ class AIRoleService:
         Returns:
             List[AIRoleResponse]: 默认角色列表
         """
-        return await self.get_roles(is_default=True, is_active=True)
+        roles = _role_cache.get(_DEFAULT_ROLES_CACHE_KEY)
+        if roles is None:
+            roles = await self.get_roles(is_default=True, is_active=True)
+            _role_cache.set(_DEFAULT_ROLES_CACHE_KEY, roles)
+        return roles
     
     async def get_roles_by_type(self, role_type: AIRoleType) -> List[AIRoleResponse]:
         """
@@ -246,17 +405,26 @@ class AIRoleService:
             Exception: 更新失败
         """
         try:
-            # 检查角色是否存在
-            existing_role = await self.get_role_by_id(role_id)
+            # 已缓存的角色名称未变化时无需检查名称冲突
+            cached_role = _role_cache.get(("id", str(role_id)))
+            check_name = role_data.name is not None and (
+                cached_role is None or role_data.name != cached_role.name
+            )
+            
+            # 并发检查角色是否存在和名称是否冲突
+            existing_role, name_conflict = await asyncio.gather(
+                self.get_role_by_id(role_id),
+                self.get_role_by_name(role_data.name) if check_name else _none()
+            )
             if not existing_role:
                 raise ValueError("角色不存在")
             
             # 准备更新数据
-            update_data = {"updated_at": datetime.utcnow().isoformat()}
+            now = datetime.utcnow()
+            update_data = {"updated_at": now.isoformat()}
             
             # 检查名称是否冲突
             if role_data.name is not None:
-                name_conflict = await self.get_role_by_name(role_data.name)
                 if name_conflict and name_conflict.id != role_id:
                     raise ValueError(f"角色名称 '{role_data.name}' 已存在")
                 update_data["name"] = role_data.name
@@ -292,18 +460,21 @@ class AIRoleService:
             
             if not result:
                 raise Exception("角色更新失败")
+            await self._invalidate_cache(role_id, existing_role.name, role_data.name)
             
-            # 获取更新后的角色
-            updated_role = await self.get_role_by_id(role_id)
+            # 在原角色上合并更新字段，无需回读
+            updated_role = existing_role.model_copy(
+                update={**role_data.model_dump(exclude_none=True), "updated_at": now}
+            )
             
-            self.logger.info(f"AI角色更新成功: {role_id}")
+            logger.info("AI角色更新成功: %s", role_id)
             return updated_role
             
         except ValueError:
             raise
         except Exception as e:
-            self.logger.error(f"AI角色更新失败: {str(e)}")
-            raise Exception(f"角色更新失败: {str(e)}")
+            logger.error("AI角色更新失败: %s", e)
+            raise
     
     async def delete_role(self, role_id: UUID) -> bool:
         """
@@ -318,39 +489,38 @@ class AIRoleService:
         Raises:
             ValueError: 角色不存在或正在使用中
         """
+        rid = str(role_id)
         try:
-            # 检查角色是否存在
-            existing_role = await self.get_role_by_id(role_id)
-            if not existing_role:
-                raise ValueError("角色不存在")
+            # 单次查询同时检查角色是否存在以及是否有活跃会话使用此角色
+            check_result = await self.db.rpc("get_role_delete_state", {"role_uuid": rid})
+            if not check_result["success"]:
+                raise Exception(check_result.get("error"))
             
-            # 检查是否有活跃的聊天会话使用此角色
-            active_sessions = await self.db.select(
-                "chat_sessions",
-                filters={"ai_role_id": str(role_id), "is_active": True},
-                limit=1
-            )
+            if not check_result["data"]:
+                raise ValueError("角色不存在")
             
-            if active_sessions:
+            role_state = check_result["data"][0]
+            if role_state["in_use"]:
                 raise ValueError("角色正在使用中，无法删除")
             
             # 执行删除
             result = await self.db.delete(
                 "ai_roles",
-                filters={"id": str(role_id)}
+                filters={"id": rid}
             )
             
             if not result:
                 raise Exception("角色删除失败")
+            await self._invalidate_cache(role_id, role_state["name"])
             
-            self.logger.info(f"AI角色删除成功: {role_id}")
+            logger.info("AI角色删除成功: %s", role_id)
             return True
             
         except ValueError:
             raise
         except Exception as e:
-            self.logger.error(f"AI角色删除失败: {str(e)}")
-            raise Exception(f"角色删除失败: {str(e)}")
+            logger.error("AI角色删除失败: %s", e)
+            raise
     
     async def increment_usage_count(self, role_id: UUID) -> bool:
         """
@@ -363,87 +533,78 @@ class AIRoleService:
             bool: 更新是否成功
         """
         try:
-            # 获取当前使用次数
-            result = await self.db.select(
-                "ai_roles",
-                filters={"id": str(role_id)},
-                columns=["usage_count"],
-                limit=1
+            # 由数据库函数原子地自增，避免先查后写的并发丢失
+            result = await self.db.rpc(
+                "increment_role_usage",
+                {"role_uuid": str(role_id)}
             )
             
-            if not result:
-                return False
-            
-            current_count = result[0]["usage_count"] or 0
-            
-            # 更新使用次数
-            update_result = await self.db.update(
-                "ai_roles",
-                {
-                    "usage_count": current_count + 1,
-                    "updated_at": datetime.utcnow().isoformat()
-                },
-                filters={"id": str(role_id)}
-            )
-            
-            return bool(update_result)
+            return bool(result["success"] and result["data"])
             
         except Exception as e:
-            self.logger.error(f"更新角色使用次数失败: {str(e)}")
+            logger.error("更新角色使用次数失败: %s", e)
             return False
     
-    async def get_role_stats(self, role_id: UUID) -> Optional[AIRoleStats]:
+    async def get_role_stats(self, role_id: UUID, fresh: bool = False) -> Optional[AIRoleStats]:
         """
         获取角色统计信息
         
         Args:
             role_id: 角色ID
+            fresh: 是否实时聚合，默认读取每分钟刷新的统计物化视图
             
         Returns:
             Optional[AIRoleStats]: 角色统计信息
         """
         try:
-            # 获取角色基本信息
-            role = await self.get_role_by_id(role_id)
+            # 并发获取角色基本信息和会话聚合统计
+            role, stats_rows = await asyncio.gather(
+                self.get_role_by_id(role_id),
+                self._fetch_session_stats(str(role_id), fresh)
+            )
             if not role:
                 return None
             
-            # 获取会话统计
-            session_stats = await self.db.select(
-                "chat_sessions",
-                filters={"ai_role_id": str(role_id)},
-                columns=["COUNT(*) as total_sessions", "SUM(message_count) as total_messages", "SUM(total_tokens) as total_tokens"]
-            )
-            
-            total_sessions = session_stats[0]["total_sessions"] if session_stats else 0
-            total_messages = session_stats[0]["total_messages"] if session_stats else 0
-            total_tokens = session_stats[0]["total_tokens"] if session_stats else 0
-            
-            # 获取活跃会话数
-            active_sessions = await self.db.select(
-                "chat_sessions",
-                filters={"ai_role_id": str(role_id), "is_active": True},
-                columns=["COUNT(*) as active_sessions"]
-            )
-            
-            active_session_count = active_sessions[0]["active_sessions"] if active_sessions else 0
+            stats = stats_rows[0] if stats_rows else {}
+            last_used_at = stats.get("last_used_at")
             
             return AIRoleStats(
                 role_id=role_id,
                 role_name=role.name,
                 usage_count=role.usage_count,
-                total_sessions=total_sessions,
-                active_sessions=active_session_count,
-                total_messages=total_messages,
-                total_tokens=total_tokens,
+                total_sessions=stats.get("total_sessions") or 0,
+                active_sessions=stats.get("active_sessions") or 0,
+                total_messages=stats.get("total_messages") or 0,
+                total_tokens=stats.get("total_tokens") or 0,
                 created_at=role.created_at,
-                last_used_at=datetime.utcnow()  # 这里可以从最近的会话获取
+                last_used_at=datetime.fromisoformat(last_used_at) if last_used_at else None
             )
             
         except Exception as e:
-            self.logger.error(f"获取角色统计失败: {str(e)}")
+            logger.error("获取角色统计失败: %s", e)
             return None
     
+    async def _fetch_session_stats(self, rid: str, fresh: bool) -> List[Dict[str, Any]]:
+        """
+        获取角色的会话聚合统计
+        
+        Args:
+            rid: 角色ID
+            fresh: 是否实时聚合
+            
+        Returns:
+            List[Dict[str, Any]]: 统计行，角色无统计时为空列表
+        """
+        if fresh:
+            result = await self.db.rpc("get_ai_role_stats", {"role_uuid": rid})
+            return result["data"] if result["success"] and result["data"] else []
+        
+        return await self.db.select(
+            "mv_ai_role_stats",
+            filters={"role_id": rid},
+            limit=1
+        ) or []
+    
     async def initialize_default_roles(self) -> bool:
         """
         初始化默认AI角色
@@ -455,72 +616,28 @@ class AIRoleService:
             # 检查是否已经初始化
             existing_roles = await self.get_default_roles()
             if existing_roles:
-                self.logger.info("默认角色已存在，跳过初始化")
+                logger.info("默认角色已存在，跳过初始化")
                 return True
             
-            # 定义默认角色
-            default_roles = [
-                {
-                    "name": "智能助手",
-                    "description": "专业的AI助手，能够回答各种问题并提供帮助",
-                    "role_type": AIRoleType.ASSISTANT,
-                    "avatar_url": "/avatars/assistant.png",
-                    "personality": "专业、友善、乐于助人",
-                    "system_prompt": "你是一个专业的AI助手，能够回答用户的各种问题。请保持友善、专业的态度，提供准确和有用的信息。",
-                    "greeting_message": "你好！我是你的智能助手，有什么可以帮助你的吗？",
-                    "is_active": True,
-                    "is_default": True
-                },
-                {
-                    "name": "创意作家",
-                    "description": "富有创意的写作助手，擅长创作故事、诗歌和文案",
-                    "role_type": AIRoleType.CREATIVE,
-                    "avatar_url": "/avatars/writer.png",
-                    "personality": "富有想象力、文艺、充满创意",
-                    "system_prompt": "你是一位富有创意的作家，擅长创作各种文学作品。请发挥你的想象力，创作出生动有趣的内容。",
-                    "greeting_message": "嗨！我是你的创意伙伴，让我们一起创作出精彩的作品吧！",
-                    "is_active": True,
-                    "is_default": True
-                },
-                {
-                    "name": "技术专家",
-                    "description": "专业的技术顾问，精通编程、系统架构和技术解决方案",
-                    "role_type": AIRoleType.TECHNICAL,
-                    "avatar_url": "/avatars/developer.png",
-                    "personality": "严谨、专业、逻辑清晰",
-                    "system_prompt": "你是一位经验丰富的技术专家，精通各种编程语言和技术栈。请提供准确的技术建议和解决方案。",
-                    "greeting_message": "你好！我是技术专家，准备好解决你的技术问题了！",
-                    "is_active": True,
-                    "is_default": True
-                },
-                {
-                    "name": "轻松聊天",
-                    "description": "轻松愉快的聊天伙伴，适合日常闲聊和娱乐",
-                    "role_type": AIRoleType.CASUAL,
-                    "avatar_url": "/avatars/casual.png",
-                    "personality": "轻松、幽默、平易近人",
-                    "system_prompt": "你是一个轻松愉快的聊天伙伴，喜欢和用户进行轻松的对话。请保持友好和幽默的态度。",
-                    "greeting_message": "嘿！很高兴见到你，我们聊点什么有趣的吧！",
-                    "is_active": True,
-                    "is_default": True
-                }
+            # 批量插入默认角色
+            now_iso = datetime.utcnow().isoformat()
+            db_rows = [
+                self._build_db_data(uuid4(), role_data, now_iso)
+                for role_data in _DEFAULT_ROLES
             ]
             
-            # 创建默认角色
-            created_count = 0
-            for role_data in default_roles:
-                try:
-                    role_create = AIRoleCreate(**role_data)
-                    await self.create_role(role_create)
-                    created_count += 1
-                except Exception as e:
-                    self.logger.error(f"创建默认角色失败: {role_data['name']} - {str(e)}")
-            
-            self.logger.info(f"默认角色初始化完成，成功创建 {created_count} 个角色")
+            result = await self.db.insert_many("ai_roles", db_rows)
+            if not result["success"]:
+                logger.error("创建默认角色失败: %s", result.get('error'))
+                return False
+            _role_cache.invalidate(_DEFAULT_ROLES_CACHE_KEY)
+            
+            created_count = len(result["data"] or [])
+            logger.info("默认角色初始化完成，成功创建 %s 个角色", created_count)
             return created_count > 0
             
         except Exception as e:
-            self.logger.error(f"初始化默认角色失败: {str(e)}")
+            logger.error("初始化默认角色失败: %s", e)
             return False
     
     async def _clear_default_roles(self, role_type: AIRoleType, exclude_id: Optional[UUID] = None) -> bool:
@@ -535,60 +652,154 @@ class AIRoleService:
             bool: 操作是否成功
         """
         try:
-            filters = {"role_type": role_type.value, "is_default": True}
-            if exclude_id:
-                # 这里需要使用NOT条件，简化处理
-                roles = await self.db.select(
-                    "ai_roles",
-                    filters={"role_type": role_type.value, "is_default": True}
-                )
-                
-                for role in roles:
-                    if role["id"] != str(exclude_id):
-                        await self.db.update(
-                            "ai_roles",
-                            {"is_default": False, "updated_at": datetime.utcnow().isoformat()},
-                            filters={"id": role["id"]}
-                        )
-            else:
-                await self.db.update(
-                    "ai_roles",
-                    {"is_default": False, "updated_at": datetime.utcnow().isoformat()},
-                    filters=filters
-                )
+            # 单条UPDATE完成清除，排除的角色通过NOT条件过滤
+            await self.db.update(
+                "ai_roles",
+                {"is_default": False, "updated_at": datetime.utcnow().isoformat()},
+                filters={"role_type": role_type.value, "is_default": True},
+                not_filters={"id": str(exclude_id)} if exclude_id else None
+            )
+            # 可能影响任意已缓存角色的默认标记
+            _role_cache.clear()
+            await self._kv_clear_roles()
             
             return True
             
         except Exception as e:
-            self.logger.error(f"清除默认角色标记失败: {str(e)}")
+            logger.error("清除默认角色标记失败: %s", e)
             return False
     
-    def _convert_to_response(self, role_data: Dict[str, Any]) -> Optional[AIRoleResponse]:
+    def _build_db_data(self, role_id: UUID, role_data: AIRoleCreate, now_iso: str) -> Dict[str, Any]:
         """
-        将数据库数据转换为响应模型
+        构建角色插入数据
         
         Args:
-            role_data: 数据库数据
+            role_id: 角色ID
+            role_data: 角色创建数据
+            now_iso: 创建时间（ISO格式）
+            
+        Returns:
+            Dict[str, Any]: 数据库数据
+        """
+        return {
+            "id": str(role_id),
+            "name": role_data.name,
+            "description": role_data.description,
+            "role_type": role_data.role_type.value,
+            "avatar_url": role_data.avatar_url,
+            "personality": role_data.personality,
+            "system_prompt": role_data.system_prompt,
+            "greeting_message": role_data.greeting_message,
+            "is_active": role_data.is_active,
+            "is_default": role_data.is_default,
+            "usage_count": 0,
+            "created_at": now_iso,
+            "updated_at": now_iso
+        }
+    
+    async def _invalidate_cache(self, role_id: UUID, *names: Optional[str]) -> None:
+        """
+        使角色相关的缓存失效
+        
+        Args:
+            role_id: 角色ID
+            *names: 角色名称（改名时需同时传入新旧名称）
+        """
+        # AI客户端模块依赖本模块，在调用时导入
+        from .ai_client import invalidate_ai_role_cache
+        invalidate_ai_role_cache(role_id)
+        
+        rid = str(role_id)
+        _role_generations[rid] = _role_generations.get(rid, 0) + 1
+        _inflight_role_loads.pop(rid, None)
+        
+        _role_cache.invalidate(("id", rid))
+        for name in names:
+            if name is not None:
+                _role_cache.invalidate(("name", name))
+        _role_cache.invalidate(_DEFAULT_ROLES_CACHE_KEY)
+        
+        if self.kv is not None:
+            try:
+                await self.kv.delete(_ROLE_KV_PREFIX + rid)
+            except Exception as e:
+                logger.warning("删除Redis角色缓存失败: %s", e)
+    
+    async def _kv_get_role(self, rid: str) -> Optional[Dict[str, Any]]:
+        """
+        从Redis读取角色记录，Redis未启用或不可用时返回None
+        
+        Args:
+            rid: 角色ID
             
         Returns:
-            Optional[AIRoleResponse]: 响应模型
+            Optional[Dict[str, Any]]: 角色数据库记录
         """
+        if self.kv is None:
+            return None
+        
         try:
-            return AIRoleResponse(
-                id=UUID(role_data["id"]),
-                name=role_data["name"],
-                description=role_data["description"],
-                role_type=AIRoleType(role_data["role_type"]),
-                avatar_url=role_data["avatar_url"],
-                personality=role_data["personality"],
-                system_prompt=role_data["system_prompt"],
-                greeting_message=role_data["greeting_message"],
-                is_active=role_data["is_active"],
-                is_default=role_data["is_default"],
-                usage_count=role_data["usage_count"] or 0,
-                created_at=datetime.fromisoformat(role_data["created_at"]),
-                updated_at=datetime.fromisoformat(role_data["updated_at"])
-            )
+            raw = await self.kv.get(_ROLE_KV_PREFIX + rid)
+        except Exception as e:
+            logger.warning("读取Redis角色缓存失败: %s", e)
+            return None
+        
+        return orjson.loads(raw) if raw is not None else None
+    
+    async def _kv_set_role(self, rid: str, role_data: Dict[str, Any]) -> None:
+        """
+        将角色记录写入Redis
+        
+        Args:
+            rid: 角色ID
+            role_data: 角色数据库记录
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            await self.kv.set(_ROLE_KV_PREFIX + rid, orjson.dumps(role_data), ex=_ROLE_KV_TTL)
+        except Exception as e:
+            logger.warning("写入Redis角色缓存失败: %s", e)
+    
+    async def _kv_clear_roles(self) -> None:
+        """
+        清空Redis中的所有角色记录
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            keys = [key async for key in self.kv.scan_iter(match=_ROLE_KV_PREFIX + "*")]
+            if keys:
+                await self.kv.delete(*keys)
         except Exception as e:
-            self.logger.error(f"转换角色数据失败: {str(e)}")
-            return None
\ No newline at end of file
+            logger.warning("清空Redis角色缓存失败: %s", e)
+    
+    def _convert_to_response(self, role_data: Dict[str, Any]) -> AIRoleResponse:
+        """
+        将数据库数据转换为响应模型
+        
+        数据来自本服务写入的数据库记录，跳过Pydantic校验直接构造
+        
+        Args:
+            role_data: 数据库数据
+            
+        Returns:
+            AIRoleResponse: 响应模型
+        """
+        return AIRoleResponse.model_construct(
+            id=UUID(role_data["id"]),
+            name=role_data["name"],
+            description=role_data["description"],
+            role_type=_ROLE_TYPES_BY_VALUE[role_data["role_type"]],
+            avatar_url=role_data["avatar_url"],
+            personality=role_data["personality"],
+            system_prompt=role_data.get("system_prompt"),
+            greeting_message=role_data["greeting_message"],
+            is_active=role_data["is_active"],
+            is_default=role_data["is_default"],
+            usage_count=role_data["usage_count"] or 0,
+            created_at=datetime.fromisoformat(role_data["created_at"]),
+            updated_at=datetime.fromisoformat(role_data["updated_at"])
+        )
@@ -10,26 +10,77 @@ ChatGalaxy 认证服务模块
 - 权限验证
 """
 
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional
 from uuid import UUID
-from datetime import datetime, timedelta
 import logging
 import secrets
 import hashlib
+import hmac
+import time
 
 from ..core.database import DatabaseManager
 from ..core.security import SecurityManager
 from ..core.config import get_settings
+from ..core.redis import get_redis
+from ..utils.cache import TTLCache
 from ..models.user import UserResponse
 from ..models.auth import (
     LoginRequest, RegisterRequest, TokenResponse, RefreshTokenRequest,
     LoginResponse, RegisterResponse, PasswordResetRequest,
-    PasswordResetConfirm, EmailVerificationRequest, EmailVerificationConfirm,
+    PasswordResetConfirm, EmailVerificationConfirm,
     ChangePasswordRequest
 )
 from .user_service import UserService
 
 
+# 已验证访问令牌的短期缓存，键为令牌摘要，值为(用户ID, 用户信息)
+_TOKEN_CACHE_TTL = 5
+_token_cache = TTLCache(maxsize=10000, ttl=_TOKEN_CACHE_TTL)
+
+
+def _token_cache_key(token: str) -> bytes:
+    """
+    计算令牌缓存键，避免在内存中保存原始令牌
+    
+    Args:
+        token: 访问令牌
+        
+    Returns:
+        bytes: 令牌摘要
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _refresh_token_hash(token: str) -> str:
+    """
+    计算刷新令牌摘要，与数据库中token_hash列的计算方式一致
+    
+    Args:
+        token: 刷新令牌
+        
+    Returns:
+        str: SHA-256前16字节的十六进制表示
+    """
+    return hashlib.sha256(token.encode()).digest()[:16].hex()
+
+
+# 近期查询过但不存在的邮箱，减少枚举邮箱时的数据库查询
+_missing_email_cache = TTLCache(maxsize=50000, ttl=300)
+
+
+def _email_cache_key(email: str) -> bytes:
+    """
+    计算邮箱缓存键，忽略大小写
+    
+    Args:
+        email: 邮箱地址
+        
+    Returns:
+        bytes: 邮箱摘要
+    """
+    return hashlib.blake2b(email.lower().encode(), digest_size=16).digest()
+
+
 class AuthService:
     """
     认证服务类
@@ -51,6 +102,11 @@ class AuthService:
         self.user_service = user_service
         self.settings = get_settings()
         self.logger = logging.getLogger(__name__)
+        # 令牌有效期（秒）
+        self._refresh_ttl_seconds = self.settings.jwt_refresh_token_expire_days * 86400
+        self._verification_ttl_seconds = 24 * 3600
+        # 可选的Redis令牌存储，数据库仍为最终数据源
+        self.kv = get_redis()
     
     async def register(self, register_data: RegisterRequest) -> RegisterResponse:
         """
@@ -66,43 +122,37 @@ class AuthService:
             ValueError: 注册数据验证失败
             Exception: 注册过程失败
         """
-        try:
-            # 验证密码一致性
-            if register_data.password != register_data.confirm_password:
-                raise ValueError("密码和确认密码不一致")
-            
-            # 创建用户
-            from ..models.user import UserCreate
-            user_create = UserCreate(
-                email=register_data.email,
-                username=register_data.username,
-                password=register_data.password,
-                confirm_password=register_data.confirm_password,
-                full_name=register_data.full_name
-            )
-            
-            user = await self.user_service.create_user(user_create)
-            
-            # 生成邮箱验证令牌
-            verification_token = self._generate_verification_token()
-            await self._store_verification_token(user.id, verification_token, "email_verification")
-            
-            self.logger.info(f"用户注册成功: {register_data.email}")
-            
-            return RegisterResponse(
-                success=True,
-                message="注册成功，请检查邮箱进行验证",
-                user_id=user.id,
-                email=user.email,
-                username=user.username,
-                verification_token=verification_token
-            )
-            
-        except ValueError:
-            raise
-        except Exception as e:
-            self.logger.error(f"用户注册失败: {str(e)}")
-            raise Exception(f"注册失败: {str(e)}")
+        # 验证密码一致性
+        if register_data.password != register_data.confirm_password:
+            raise ValueError("密码和确认密码不一致")
+        
+        # 创建用户
+        from ..models.user import UserCreate
+        user_create = UserCreate(
+            email=register_data.email,
+            username=register_data.username,
+            password=register_data.password,
+            confirm_password=register_data.confirm_password,
+            full_name=register_data.full_name
+        )
+        
+        user = await self.user_service.create_user(user_create)
+        _missing_email_cache.invalidate(_email_cache_key(user.email))
+        
+        # 生成邮箱验证令牌
+        verification_token = self._generate_verification_token()
+        await self._store_verification_token(user.id, verification_token, "email_verification")
+        
+        self.logger.info("用户注册成功: %s", register_data.email)
+        
+        return RegisterResponse(
+            success=True,
+            message="注册成功，请检查邮箱进行验证",
+            user_id=user.id,
+            email=user.email,
+            username=user.username,
+            verification_token=verification_token
+        )
     
     async def login(self, login_data: LoginRequest) -> LoginResponse:
         """
@@ -118,64 +168,45 @@ class AuthService:
             ValueError: 登录凭据无效
             Exception: 登录过程失败
         """
-        try:
-            # 获取用户信息
-            user = await self.user_service.get_user_by_email(login_data.email)
-            if not user:
-                raise ValueError("邮箱或密码错误")
-            
-            # 检查用户状态
-            if not user.is_active:
-                raise ValueError("账户已被停用")
-            
-            # 获取用户密码哈希
-            user_data = await self.db.select(
-                "users",
-                filters={"email": login_data.email},
-                columns=["id", "password_hash"],
-                limit=1
-            )
-            
-            if not user_data:
-                raise ValueError("邮箱或密码错误")
-            
-            password_hash = user_data[0]["password_hash"]
-            
-            # 验证密码
-            if not self.security.verify_password(login_data.password, password_hash):
-                raise ValueError("邮箱或密码错误")
-            
-            # 生成令牌
-            access_token = self.security.create_access_token(
-                data={"sub": str(user.id), "email": user.email, "username": user.username}
-            )
-            refresh_token = self.security.create_refresh_token(
-                data={"sub": str(user.id)}
-            )
-            
-            # 更新最后登录时间
-            await self.user_service.update_last_login(user.id)
-            
-            # 存储刷新令牌
-            await self._store_refresh_token(user.id, refresh_token)
-            
-            self.logger.info(f"用户登录成功: {login_data.email}")
-            
-            return LoginResponse(
-                success=True,
-                message="登录成功",
-                access_token=access_token,
-                refresh_token=refresh_token,
-                token_type="bearer",
-                expires_in=self.settings.jwt_access_token_expire_minutes * 60,
-                user=user
-            )
-            
-        except ValueError:
-            raise
-        except Exception as e:
-            self.logger.error(f"用户登录失败: {str(e)}")
-            raise Exception(f"登录失败: {str(e)}")
+        # 获取用户信息和密码哈希
+        credentials = await self.user_service.get_user_with_credentials(login_data.email)
+        if not credentials:
+            raise ValueError("邮箱或密码错误")
+        
+        user, password_hash = credentials
+        
+        # 检查用户状态
+        if not user.is_active:
+            raise ValueError("账户已被停用")
+        
+        # 验证密码
+        if not await self.security.verify_password_async(login_data.password, password_hash):
+            raise ValueError("邮箱或密码错误")
+        
+        # 生成令牌
+        tokens = self.security.create_token_pair(
+            {"sub": str(user.id), "email": user.email, "username": user.username}
+        )
+        access_token = tokens["access_token"]
+        refresh_token = tokens["refresh_token"]
+        
+        # 后台更新最后登录时间
+        self.user_service.schedule_last_login_update(user.id)
+        
+        # 存储刷新令牌
+        await self._store_refresh_token(user.id, refresh_token)
+        
+        self.logger.info("用户登录成功: %s", login_data.email)
+        
+        return LoginResponse(
+            success=True,
+            message="登录成功",
+            access_token=access_token,
+            refresh_token=refresh_token,
+            token_type="bearer",
+            expires_in=self.settings.jwt_access_token_expire_minutes * 60,
+            user=user
+        )
     
     async def refresh_token(self, refresh_data: RefreshTokenRequest) -> TokenResponse:
         """
@@ -191,54 +222,45 @@ class AuthService:
             ValueError: 刷新令牌无效
             Exception: 刷新过程失败
         """
-        try:
-            # 验证刷新令牌
-            payload = self.security.verify_refresh_token(refresh_data.refresh_token)
-            if not payload:
-                raise ValueError("无效的刷新令牌")
-            
-            user_id = UUID(payload.get("sub"))
-            
-            # 检查刷新令牌是否存在且有效
-            token_valid = await self._verify_refresh_token(user_id, refresh_data.refresh_token)
-            if not token_valid:
-                raise ValueError("刷新令牌已失效")
-            
-            # 获取用户信息
-            user = await self.user_service.get_user_by_id(user_id)
-            if not user or not user.is_active:
-                raise ValueError("用户不存在或已被停用")
-            
-            # 生成新的访问令牌
-            access_token = self.security.create_access_token(
-                data={"sub": str(user.id), "email": user.email, "username": user.username}
-            )
-            
-            # 生成新的刷新令牌
-            new_refresh_token = self.security.create_refresh_token(
-                data={"sub": str(user.id)}
-            )
-            
-            # 更新刷新令牌
-            await self._update_refresh_token(user_id, refresh_data.refresh_token, new_refresh_token)
-            
-            self.logger.info(f"令牌刷新成功: {user.email}")
-            
-            return TokenResponse(
-                access_token=access_token,
-                refresh_token=new_refresh_token,
-                token_type="bearer",
-                expires_in=self.settings.jwt_access_token_expire_minutes * 60,
-                user_id=user.id,
-                username=user.username,
-                email=user.email
-            )
-            
-        except ValueError:
-            raise
-        except Exception as e:
-            self.logger.error(f"令牌刷新失败: {str(e)}")
-            raise Exception(f"令牌刷新失败: {str(e)}")
+        # 验证刷新令牌
+        payload = self.security.verify_refresh_token(refresh_data.refresh_token)
+        if not payload:
+            raise ValueError("无效的刷新令牌")
+        
+        user_id = UUID(payload.get("sub"))
+        
+        # 检查刷新令牌是否存在且有效
+        token_valid = await self._verify_refresh_token(user_id, refresh_data.refresh_token)
+        if not token_valid:
+            raise ValueError("刷新令牌已失效")
+        
+        # 获取用户信息，停用状态以数据库为准
+        user = await self.user_service.get_user_by_id(user_id, use_cache=False)
+        if not user or not user.is_active:
+            raise ValueError("用户不存在或已被停用")
+        
+        # 生成新的访问令牌和刷新令牌
+        tokens = self.security.create_token_pair(
+            {"sub": str(user.id), "email": user.email, "username": user.username}
+        )
+        access_token = tokens["access_token"]
+        new_refresh_token = tokens["refresh_token"]
+        
+        # 更新刷新令牌
+        if not await self._update_refresh_token(user_id, refresh_data.refresh_token, new_refresh_token):
+            raise ValueError("刷新令牌已失效")
+        
+        self.logger.info("令牌刷新成功: %s", user.email)
+        
+        return TokenResponse(
+            access_token=access_token,
+            refresh_token=new_refresh_token,
+            token_type="bearer",
+            expires_in=self.settings.jwt_access_token_expire_minutes * 60,
+            user_id=user.id,
+            username=user.username,
+            email=user.email
+        )
     
     async def logout(self, user_id: UUID, refresh_token: str) -> bool:
         """
@@ -255,14 +277,16 @@ class AuthService:
             # 删除刷新令牌
             result = await self.db.delete(
                 "refresh_tokens",
-                filters={"user_id": str(user_id), "token": refresh_token}
+                filters={"user_id": str(user_id), "token_hash": _refresh_token_hash(refresh_token)}
             )
+            await self._kv_delete(self._refresh_token_key(user_id, refresh_token))
+            self._invalidate_user_tokens(user_id)
             
-            self.logger.info(f"用户登出成功: {user_id}")
+            self.logger.info("用户登出成功: %s", user_id)
             return True
             
         except Exception as e:
-            self.logger.error(f"用户登出失败: {str(e)}")
+            self.logger.error("用户登出失败: %s", e)
             return False
     
     async def request_password_reset(self, reset_data: PasswordResetRequest) -> bool:
@@ -276,9 +300,14 @@ class AuthService:
             bool: 请求是否成功
         """
         try:
-            # 检查用户是否存在
+            # 检查用户是否存在，只缓存不存在的结果
+            email_key = _email_cache_key(reset_data.email)
+            if email_key in _missing_email_cache:
+                return True
+            
             user = await self.user_service.get_user_by_email(reset_data.email)
             if not user:
+                _missing_email_cache.set(email_key, False)
                 # 为了安全，即使用户不存在也返回成功
                 return True
             
@@ -286,11 +315,11 @@ class AuthService:
             reset_token = self._generate_verification_token()
             await self._store_verification_token(user.id, reset_token, "password_reset")
             
-            self.logger.info(f"密码重置请求成功: {reset_data.email}")
+            self.logger.info("密码重置请求成功: %s", reset_data.email)
             return True
             
         except Exception as e:
-            self.logger.error(f"密码重置请求失败: {str(e)}")
+            self.logger.error("密码重置请求失败: %s", e)
             return False
     
     async def confirm_password_reset(self, confirm_data: PasswordResetConfirm) -> bool:
@@ -306,47 +335,22 @@ class AuthService:
         Raises:
             ValueError: 重置令牌无效或密码不一致
         """
-        try:
-            # 验证密码一致性
-            if confirm_data.new_password != confirm_data.confirm_password:
-                raise ValueError("密码和确认密码不一致")
-            
-            # 验证重置令牌
-            user_id = await self._verify_verification_token(confirm_data.token, "password_reset")
-            if not user_id:
-                raise ValueError("无效或已过期的重置令牌")
-            
-            # 更新密码
-            password_hash = self.security.hash_password(confirm_data.new_password)
-            result = await self.db.update(
-                "users",
-                {
-                    "password_hash": password_hash,
-                    "updated_at": datetime.utcnow().isoformat()
-                },
-                filters={"id": str(user_id)}
-            )
-            
-            if not result:
-                raise Exception("密码更新失败")
-            
-            # 删除重置令牌
-            await self._delete_verification_token(confirm_data.token)
-            
-            # 删除所有刷新令牌，强制重新登录
-            await self.db.delete(
-                "refresh_tokens",
-                filters={"user_id": str(user_id)}
-            )
-            
-            self.logger.info(f"密码重置成功: {user_id}")
-            return True
-            
-        except ValueError:
-            raise
-        except Exception as e:
-            self.logger.error(f"密码重置失败: {str(e)}")
-            raise Exception(f"密码重置失败: {str(e)}")
+        # 验证密码一致性
+        if confirm_data.new_password != confirm_data.confirm_password:
+            raise ValueError("密码和确认密码不一致")
+        
+        # 验证重置令牌
+        user_id = await self._verify_verification_token(confirm_data.token, "password_reset")
+        if not user_id:
+            raise ValueError("无效或已过期的重置令牌")
+        
+        # 更新密码，同时删除重置令牌和所有刷新令牌，强制重新登录
+        password_hash = await self.security.hash_password_async(confirm_data.new_password)
+        if not await self._apply_password_change(user_id, password_hash, confirm_data.token):
+            raise Exception("密码更新失败")
+        
+        self.logger.info("密码重置成功: %s", user_id)
+        return True
     
     async def verify_email(self, verify_data: EmailVerificationConfirm) -> bool:
         """
@@ -361,28 +365,18 @@ class AuthService:
         Raises:
             ValueError: 验证令牌无效
         """
-        try:
-            # 验证邮箱验证令牌
-            user_id = await self._verify_verification_token(verify_data.token, "email_verification")
-            if not user_id:
-                raise ValueError("无效或已过期的验证令牌")
-            
-            # 更新邮箱验证状态
-            success = await self.user_service.verify_email(user_id)
-            if not success:
-                raise Exception("邮箱验证更新失败")
-            
-            # 删除验证令牌
-            await self._delete_verification_token(verify_data.token)
-            
-            self.logger.info(f"邮箱验证成功: {user_id}")
-            return True
-            
-        except ValueError:
-            raise
-        except Exception as e:
-            self.logger.error(f"邮箱验证失败: {str(e)}")
-            raise Exception(f"邮箱验证失败: {str(e)}")
+        # 验证并消费邮箱验证令牌
+        user_id = await self._verify_verification_token(verify_data.token, "email_verification")
+        if not user_id:
+            raise ValueError("无效或已过期的验证令牌")
+        
+        # 更新邮箱验证状态
+        success = await self.user_service.verify_email(user_id)
+        if not success:
+            raise Exception("邮箱验证更新失败")
+        
+        self.logger.info("邮箱验证成功: %s", user_id)
+        return True
     
     async def change_password(self, user_id: UUID, change_data: ChangePasswordRequest) -> bool:
         """
@@ -398,56 +392,34 @@ class AuthService:
         Raises:
             ValueError: 密码验证失败
         """
-        try:
-            # 验证新密码一致性
-            if change_data.new_password != change_data.confirm_password:
-                raise ValueError("新密码和确认密码不一致")
-            
-            # 获取当前密码哈希
-            user_data = await self.db.select(
-                "users",
-                filters={"id": str(user_id)},
-                columns=["password_hash"],
-                limit=1
-            )
-            
-            if not user_data:
-                raise ValueError("用户不存在")
-            
-            current_password_hash = user_data[0]["password_hash"]
-            
-            # 验证当前密码
-            if not self.security.verify_password(change_data.current_password, current_password_hash):
-                raise ValueError("当前密码错误")
-            
-            # 更新密码
-            new_password_hash = self.security.hash_password(change_data.new_password)
-            result = await self.db.update(
-                "users",
-                {
-                    "password_hash": new_password_hash,
-                    "updated_at": datetime.utcnow().isoformat()
-                },
-                filters={"id": str(user_id)}
-            )
-            
-            if not result:
-                raise Exception("密码更新失败")
-            
-            # 删除所有刷新令牌，强制重新登录
-            await self.db.delete(
-                "refresh_tokens",
-                filters={"user_id": str(user_id)}
-            )
-            
-            self.logger.info(f"密码修改成功: {user_id}")
-            return True
-            
-        except ValueError:
-            raise
-        except Exception as e:
-            self.logger.error(f"密码修改失败: {str(e)}")
-            raise Exception(f"密码修改失败: {str(e)}")
+        # 验证新密码一致性
+        if change_data.new_password != change_data.confirm_password:
+            raise ValueError("新密码和确认密码不一致")
+        
+        # 获取当前密码哈希
+        user_data = await self.db.select(
+            "users",
+            filters={"id": str(user_id)},
+            columns=["password_hash"],
+            limit=1
+        )
+        
+        if not user_data:
+            raise ValueError("用户不存在")
+        
+        current_password_hash = user_data[0]["password_hash"]
+        
+        # 验证当前密码
+        if not await self.security.verify_password_async(change_data.current_password, current_password_hash):
+            raise ValueError("当前密码错误")
+        
+        # 更新密码，同时删除所有刷新令牌，强制重新登录
+        new_password_hash = await self.security.hash_password_async(change_data.new_password)
+        if not await self._apply_password_change(user_id, new_password_hash):
+            raise Exception("密码更新失败")
+        
+        self.logger.info("密码修改成功: %s", user_id)
+        return True
     
     async def get_current_user(self, token: str) -> Optional[UserResponse]:
         """
@@ -459,6 +431,11 @@ class AuthService:
         Returns:
             Optional[UserResponse]: 用户信息，无效则返回None
         """
+        cache_key = _token_cache_key(token)
+        cached = _token_cache.get(cache_key)
+        if cached is not None:
+            return cached[1]
+        
         try:
             # 验证访问令牌
             payload = self.security.verify_access_token(token)
@@ -466,12 +443,66 @@ class AuthService:
                 return None
             
             user_id = UUID(payload.get("sub"))
-            return await self.user_service.get_user_by_id(user_id)
+            
+            # 绕过进程内用户缓存，停用状态以数据库为准
+            user = await self.user_service.get_user_by_id(user_id, use_cache=False)
+            
+            # 缓存时间不超过令牌剩余有效期
+            exp = payload.get("exp")
+            ttl = min(_TOKEN_CACHE_TTL, exp - time.time()) if exp else _TOKEN_CACHE_TTL
+            if user is not None and ttl > 0:
+                _token_cache.set(cache_key, (user_id, user), ttl=ttl)
+            
+            return user
             
         except Exception as e:
-            self.logger.error(f"获取当前用户失败: {str(e)}")
+            self.logger.error("获取当前用户失败: %s", e)
             return None
     
+    async def _apply_password_change(
+        self,
+        user_id: UUID,
+        password_hash: str,
+        reset_token: Optional[str] = None
+    ) -> bool:
+        """
+        更新用户密码并使已有会话失效
+        
+        密码更新与令牌删除在数据库函数中以单个事务完成，
+        不存在密码已更新但旧刷新令牌仍有效的窗口
+        
+        Args:
+            user_id: 用户ID
+            password_hash: 新密码哈希
+            reset_token: 需要一并删除的密码重置令牌
+            
+        Returns:
+            bool: 更新是否成功，用户不存在时返回False
+        """
+        result = await self.db.rpc(
+            "apply_password_change",
+            {
+                "user_uuid": str(user_id),
+                "new_password_hash": password_hash,
+                "reset_token": reset_token
+            }
+        )
+        if not result["success"] or not result["data"]:
+            return False
+        
+        await self._kv_delete_user_refresh_tokens(user_id)
+        self._invalidate_user_tokens(user_id)
+        return True
+    
+    def _invalidate_user_tokens(self, user_id: UUID) -> None:
+        """
+        清除指定用户的已验证令牌缓存
+        
+        Args:
+            user_id: 用户ID
+        """
+        _token_cache.invalidate_values(lambda cached: cached[0] == user_id)
+    
     def _generate_verification_token(self) -> str:
         """
         生成验证令牌
@@ -494,26 +525,30 @@ class AuthService:
             bool: 存储是否成功
         """
         try:
-            expires_at = datetime.utcnow() + timedelta(hours=24)  # 24小时有效期
+            # 时间以Unix时间戳（秒）存储
+            now = int(time.time())
             
             token_data = {
                 "user_id": str(user_id),
                 "token": token,
                 "token_type": token_type,
-                "expires_at": expires_at.isoformat(),
-                "created_at": datetime.utcnow().isoformat()
+                "expires_at": now + self._verification_ttl_seconds,
+                "created_at": now
             }
             
             result = await self.db.insert("verification_tokens", token_data)
             return bool(result)
             
         except Exception as e:
-            self.logger.error(f"存储验证令牌失败: {str(e)}")
+            self.logger.error("存储验证令牌失败: %s", e)
             return False
     
     async def _verify_verification_token(self, token: str, token_type: str) -> Optional[UUID]:
         """
-        验证验证令牌
+        验证并消费验证令牌
+        
+        以数据库中的令牌行为准，删除与校验在同一条DELETE中完成，
+        令牌只能成功使用一次
         
         Args:
             token: 令牌
@@ -523,51 +558,26 @@ class AuthService:
             Optional[UUID]: 用户ID，无效则返回None
         """
         try:
-            result = await self.db.select(
+            result = await self.db.delete(
                 "verification_tokens",
-                filters={"token": token, "token_type": token_type},
-                limit=1
+                filters={"token": token, "token_type": token_type}
             )
             
             if not result:
                 return None
             
             token_data = result[0]
-            expires_at = datetime.fromisoformat(token_data["expires_at"])
             
-            # 检查是否过期
-            if datetime.utcnow() > expires_at:
-                # 删除过期令牌
-                await self._delete_verification_token(token)
+            # 检查是否过期，过期令牌由数据库定时任务清理
+            if int(time.time()) > token_data["expires_at"]:
                 return None
             
             return UUID(token_data["user_id"])
             
         except Exception as e:
-            self.logger.error(f"验证验证令牌失败: {str(e)}")
+            self.logger.error("验证验证令牌失败: %s", e)
             return None
     
-    async def _delete_verification_token(self, token: str) -> bool:
-        """
-        删除验证令牌
-        
-        Args:
-            token: 令牌
-            
-        Returns:
-            bool: 删除是否成功
-        """
-        try:
-            result = await self.db.delete(
-                "verification_tokens",
-                filters={"token": token}
-            )
-            return bool(result)
-            
-        except Exception as e:
-            self.logger.error(f"删除验证令牌失败: {str(e)}")
-            return False
-    
     async def _store_refresh_token(self, user_id: UUID, token: str) -> bool:
         """
         存储刷新令牌
@@ -580,20 +590,28 @@ class AuthService:
             bool: 存储是否成功
         """
         try:
-            expires_at = datetime.utcnow() + timedelta(days=self.settings.jwt_refresh_token_expire_days)
+            # 时间以Unix时间戳（秒）存储
+            now = int(time.time())
             
             token_data = {
                 "user_id": str(user_id),
                 "token": token,
-                "expires_at": expires_at.isoformat(),
-                "created_at": datetime.utcnow().isoformat()
+                "token_hash": _refresh_token_hash(token),
+                "expires_at": now + self._refresh_ttl_seconds,
+                "created_at": now
             }
             
             result = await self.db.insert("refresh_tokens", token_data)
+            if result:
+                await self._kv_set(
+                    self._refresh_token_key(user_id, token),
+                    b"1",
+                    self._refresh_ttl_seconds
+                )
             return bool(result)
             
         except Exception as e:
-            self.logger.error(f"存储刷新令牌失败: {str(e)}")
+            self.logger.error("存储刷新令牌失败: %s", e)
             return False
     
     async def _verify_refresh_token(self, user_id: UUID, token: str) -> bool:
@@ -608,9 +626,14 @@ class AuthService:
             bool: 令牌是否有效
         """
         try:
+            # 优先查询Redis，未命中时回退到数据库
+            if await self._kv_get(self._refresh_token_key(user_id, token)) is not None:
+                return True
+            
+            # 按定长摘要查找，再以常数时间比较完整令牌
             result = await self.db.select(
                 "refresh_tokens",
-                filters={"user_id": str(user_id), "token": token},
+                filters={"user_id": str(user_id), "token_hash": _refresh_token_hash(token)},
                 limit=1
             )
             
@@ -618,21 +641,17 @@ class AuthService:
                 return False
             
             token_data = result[0]
-            expires_at = datetime.fromisoformat(token_data["expires_at"])
-            
-            # 检查是否过期
-            if datetime.utcnow() > expires_at:
-                # 删除过期令牌
-                await self.db.delete(
-                    "refresh_tokens",
-                    filters={"token": token}
-                )
+            if not hmac.compare_digest(token_data["token"], token):
+                return False
+            
+            # 检查是否过期，过期令牌由数据库定时任务清理
+            if int(time.time()) > token_data["expires_at"]:
                 return False
             
             return True
             
         except Exception as e:
-            self.logger.error(f"验证刷新令牌失败: {str(e)}")
+            self.logger.error("验证刷新令牌失败: %s", e)
             return False
     
     async def _update_refresh_token(self, user_id: UUID, old_token: str, new_token: str) -> bool:
@@ -645,18 +664,115 @@ class AuthService:
             new_token: 新令牌
             
         Returns:
-            bool: 更新是否成功
+            bool: 更新是否成功，旧令牌不存在时返回False
         """
         try:
-            # 删除旧令牌
-            await self.db.delete(
+            # 单条UPDATE原地替换旧令牌，未匹配到行说明旧令牌已失效
+            now = int(time.time())
+            result = await self.db.update(
                 "refresh_tokens",
-                filters={"user_id": str(user_id), "token": old_token}
+                {
+                    "token": new_token,
+                    "token_hash": _refresh_token_hash(new_token),
+                    "expires_at": now + self._refresh_ttl_seconds,
+                    "created_at": now
+                },
+                filters={"user_id": str(user_id), "token_hash": _refresh_token_hash(old_token)}
             )
             
-            # 存储新令牌
-            return await self._store_refresh_token(user_id, new_token)
+            await self._kv_delete(self._refresh_token_key(user_id, old_token))
+            if not result:
+                return False
+            
+            await self._kv_set(
+                self._refresh_token_key(user_id, new_token),
+                b"1",
+                self._refresh_ttl_seconds
+            )
+            return True
             
         except Exception as e:
-            self.logger.error(f"更新刷新令牌失败: {str(e)}")
-            return False
\ No newline at end of file
+            self.logger.error("更新刷新令牌失败: %s", e)
+            return False
+    
+    @staticmethod
+    def _refresh_token_key(user_id: UUID, token: str) -> str:
+        """
+        构建刷新令牌的Redis键
+        
+        Args:
+            user_id: 用户ID
+            token: 刷新令牌
+            
+        Returns:
+            str: Redis键
+        """
+        return f"rt:{user_id}:{hashlib.blake2b(token.encode(), digest_size=16).hexdigest()}"
+    
+    async def _kv_get(self, key: str) -> Optional[bytes]:
+        """
+        读取Redis值，Redis未启用或不可用时返回None
+        
+        Args:
+            key: Redis键
+            
+        Returns:
+            Optional[bytes]: 存储的值
+        """
+        if self.kv is None:
+            return None
+        
+        try:
+            return await self.kv.get(key)
+        except Exception as e:
+            self.logger.warning("读取Redis令牌失败: %s", e)
+            return None
+    
+    async def _kv_set(self, key: str, value: bytes, ttl_seconds: int) -> None:
+        """
+        写入带过期时间的Redis值
+        
+        Args:
+            key: Redis键
+            value: 存储的值
+            ttl_seconds: 过期时间（秒）
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            await self.kv.setex(key, ttl_seconds, value)
+        except Exception as e:
+            self.logger.warning("写入Redis令牌失败: %s", e)
+    
+    async def _kv_delete(self, *keys: str) -> None:
+        """
+        删除Redis键
+        
+        Args:
+            *keys: Redis键
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            await self.kv.delete(*keys)
+        except Exception as e:
+            self.logger.warning("删除Redis令牌失败: %s", e)
+    
+    async def _kv_delete_user_refresh_tokens(self, user_id: UUID) -> None:
+        """
+        删除用户在Redis中的所有刷新令牌
+        
+        Args:
+            user_id: 用户ID
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            keys = [key async for key in self.kv.scan_iter(match=f"rt:{user_id}:*")]
+            if keys:
+                await self.kv.delete(*keys)
+        except Exception as e:
+            self.logger.warning("删除Redis刷新令牌失败: %s", e)
@@ -11,16 +11,23 @@ ChatGalaxy 聊天服务模块
 - 流式响应处理
 """
 
-from typing import List, Optional, Dict, Any, AsyncGenerator
+from collections import deque
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, AsyncGenerator, Set, Tuple
 from uuid import UUID, uuid4
 from datetime import datetime
 import logging
-import json
 import asyncio
+import hmac
+import re
+import orjson
 from fastapi import HTTPException
 
 from ..core.database import DatabaseManager
+from ..core.config import settings
+from ..core.redis import get_redis
 from ..core.ai_client import AIClient, get_ai_client, AIResponse, StreamChunk
+from ..utils.cache import TTLCache
 from ..models.chat_session import (
     ChatSession, ChatSessionCreate, ChatSessionUpdate, 
     ChatSessionResponse, SessionStatus
@@ -32,11 +39,91 @@ from ..models.chat_message import (
 from ..models.chat import (
     ChatRequest, ChatResponse, StreamChatResponse,
     ChatHistory, ChatContext, ChatSessionCreate as ChatSessionCreateRequest,
-    ChatSessionResponse as ChatSessionCreateResponse, MessageRole
+    ChatSessionResponse as ChatSessionCreateResponse
 )
 from ..models.chat_message import MessageStatus
 from .ai_role_service import AIRoleService
 from .user_service import UserService
+from .message_writer import get_message_writer
+from .session_stats import get_session_stats_buffer
+
+
+# Redis中缓存的会话最近消息（最新在前），键为ctx:{会话ID}
+_CONTEXT_KV_PREFIX = "ctx:"
+_CONTEXT_KV_SIZE = 20
+_CONTEXT_KV_TTL = 24 * 3600
+
+# 未启用Redis时的进程内上下文缓存，键为会话ID，值为按时间正序的消息环形缓冲区
+# 仅适用于单进程部署，需通过LOCAL_CONTEXT_CACHE显式启用，多进程部署应配置REDIS_URL以共享缓存
+_local_context = TTLCache(maxsize=10000, ttl=1800)
+
+# 进入对话上下文的消息类型及其对应的AI对话角色
+_CONTEXT_ROLES = {
+    MessageType.USER.value: "user",
+    MessageType.ASSISTANT.value: "assistant"
+}
+
+# 对话上下文默认token预算（按_estimate_tokens估算）
+_CONTEXT_TOKEN_BUDGET = 2000
+
+# 无论预算多少都保留的最近消息条数（最近一轮用户和AI消息）
+_CONTEXT_MIN_MESSAGES = 2
+
+# 中日韩文字及全角符号，约一字一token
+_CJK_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+# Redis中缓存的会话记录，键为sess:{会话ID}
+_SESSION_KV_PREFIX = "sess:"
+_SESSION_KV_TTL = 60
+
+# Redis中广播流式响应片段的频道，键为chan:sess:{会话ID}
+_STREAM_CHANNEL_PREFIX = "chan:sess:"
+
+@lru_cache(maxsize=4096)
+def _parse_uuid(value: str) -> UUID:
+    """
+    解析UUID字符串并缓存结果
+    
+    用于会话ID、角色ID等在多行结果中重复出现的值
+    
+    Args:
+        value: UUID字符串
+        
+    Returns:
+        UUID: 解析后的UUID
+    """
+    return UUID(value)
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数
+    
+    中日韩字符约一字一token，其余字符约四个一token
+    
+    Args:
+        text: 文本
+        
+    Returns:
+        int: 估算的token数
+    """
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+# 流式响应结束后的后台保存任务，持有引用避免任务被回收
+_finalize_tasks: Set[asyncio.Task] = set()
+
+# 流式响应片段的后台广播任务，持有引用避免任务被回收
+_publish_tasks: Set[asyncio.Task] = set()
+
+
+async def flush_finalize_tasks():
+    """
+    等待后台执行中的流式响应保存任务完成
+    """
+    if _finalize_tasks:
+        await asyncio.gather(*_finalize_tasks, return_exceptions=True)
 
 
 class ChatService:
@@ -66,6 +153,14 @@ class ChatService:
         self.ai_client = ai_client
         self.ai_role_service = ai_role_service or AIRoleService(db)
         self.user_service = user_service or UserService(db)
+        # 全局共享的消息批量写入器
+        self.message_writer = get_message_writer(db)
+        # 全局共享的会话统计缓冲区
+        self.session_stats = get_session_stats_buffer(db)
+        # 可选的Redis上下文缓存
+        self.kv = get_redis()
+        # 未启用Redis时，仅在显式开启后使用进程内上下文缓存
+        self.local_context = self.kv is None and settings.LOCAL_CONTEXT_CACHE
         self.logger = logging.getLogger(__name__)
     
     async def create_session(
@@ -103,6 +198,8 @@ class ChatService:
                 session_token = secrets.token_urlsafe(32)
             
             # 准备数据库数据
+            now = datetime.utcnow()
+            now_iso = now.isoformat()
             db_data = {
                 "id": str(session_id),
                 "title": session_data.title or f"与{ai_role.name}的对话",
@@ -114,26 +211,28 @@ class ChatService:
                 "message_count": 0,
                 "total_tokens": 0,
                 "last_message_at": None,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
+                "created_at": now_iso,
+                "updated_at": now_iso
             }
             
-            # 插入数据库
-            result = await self.db.insert("chat_sessions", db_data)
-            if not result:
-                raise Exception("会话创建失败")
-            
-            # 增加角色使用次数
-            await self.ai_role_service.increment_usage_count(session_data.ai_role_id)
-            
-            # 发送欢迎消息
+            # 欢迎消息随会话一并写入
+            greeting_data = None
             if ai_role.greeting_message:
-                await self._create_system_message(
+                greeting_data = self._build_system_message(
                     session_id,
                     ai_role.greeting_message,
-                    session_data.ai_role_id
+                    session_data.ai_role_id,
+                    now_iso
                 )
             
+            # 由数据库函数在单次调用中创建会话、写入欢迎消息并增加角色使用次数
+            result = await self.db.rpc(
+                "create_chat_session",
+                {"session": db_data, "greeting": greeting_data}
+            )
+            if not result["success"]:
+                raise Exception(result.get("error") or "会话创建失败")
+            
             self.logger.info(f"聊天会话创建成功: {session_id}")
             
             return ChatSessionCreateResponse(
@@ -141,7 +240,7 @@ class ChatService:
                 session_token=session_token,
                 ai_role=ai_role,
                 title=db_data["title"],
-                created_at=datetime.fromisoformat(db_data["created_at"])
+                created_at=now
             )
             
         except ValueError:
@@ -168,45 +267,48 @@ class ChatService:
             Optional[ChatSessionResponse]: 会话信息
         """
         try:
-            # 构建查询条件
-            filters = {"id": str(session_id)}
+            # 访客模式必须提供会话令牌
+            if not user_id and not session_token:
+                return None
             
-            # 根据用户类型添加验证条件
-            if user_id:
-                filters["user_id"] = str(user_id)
-            else:
-                if not session_token:
+            # 按会话ID查询，优先读取Redis缓存
+            session_data = await self._kv_get_session(session_id)
+            if session_data is None:
+                result = await self.db.select(
+                    "chat_sessions",
+                    filters={"id": str(session_id)},
+                    limit=1
+                )
+                
+                if not result:
                     return None
-                filters["session_token"] = session_token
-                filters["user_id"] = None  # 确保是访客会话
-            
-            # 查询会话
-            result = await self.db.select(
-                "chat_sessions",
-                filters=filters,
-                limit=1
-            )
-            
-            if not result:
-                return None
+                
+                session_data = result[0]
+                await self._kv_set_session(session_id, session_data)
             
-            session_data = result[0]
+            # 根据用户类型验证访问权限
+            if user_id:
+                if session_data["user_id"] != str(user_id):
+                    return None
+            elif session_data["user_id"] is not None or not hmac.compare_digest(
+                session_data["session_token"] or "", session_token
+            ):
+                return None  # 确保是访客会话且令牌匹配
             
             # 获取AI角色信息
-            ai_role = await self.ai_role_service.get_role_by_id(
-                UUID(session_data["ai_role_id"])
-            )
+            ai_role_id = _parse_uuid(session_data["ai_role_id"])
+            ai_role = await self.ai_role_service.get_role_by_id(ai_role_id)
             
             if not ai_role:
                 return None
             
             return ChatSessionResponse(
-                id=UUID(session_data["id"]),
+                id=session_id,
                 title=session_data["title"],
-                ai_role_id=UUID(session_data["ai_role_id"]),
+                ai_role_id=ai_role_id,
                 ai_role_name=ai_role.name,
                 ai_role_avatar=ai_role.avatar_url,
-                user_id=UUID(session_data["user_id"]) if session_data["user_id"] else None,
+                user_id=_parse_uuid(session_data["user_id"]) if session_data["user_id"] else None,
                 session_token=session_data["session_token"],
                 is_active=session_data["is_active"],
                 session_status=SessionStatus(session_data["session_status"]),
@@ -255,22 +357,25 @@ class ChatService:
                 limit=limit
             )
             
+            # 单次查询获取所有会话的AI角色信息
+            roles = await self.ai_role_service.get_roles_by_ids(
+                _parse_uuid(session_data["ai_role_id"]) for session_data in result
+            )
+            
             # 转换为响应模型
             sessions = []
             for session_data in result:
-                # 获取AI角色信息
-                ai_role = await self.ai_role_service.get_role_by_id(
-                    UUID(session_data["ai_role_id"])
-                )
+                ai_role_id = _parse_uuid(session_data["ai_role_id"])
+                ai_role = roles.get(ai_role_id)
                 
                 if ai_role:
                     session_response = ChatSessionResponse(
-                        id=UUID(session_data["id"]),
+                        id=session_data["id"],
                         title=session_data["title"],
-                        ai_role_id=UUID(session_data["ai_role_id"]),
+                        ai_role_id=ai_role_id,
                         ai_role_name=ai_role.name,
                         ai_role_avatar=ai_role.avatar_url,
-                        user_id=UUID(session_data["user_id"]) if session_data["user_id"] else None,
+                        user_id=user_id,
                         session_token=session_data["session_token"],
                         is_active=session_data["is_active"],
                         session_status=SessionStatus(session_data["session_status"]),
@@ -317,43 +422,35 @@ class ChatService:
             if not session:
                 raise ValueError("会话不存在或无权限访问")
             
-            # 获取AI角色
+            # 先确认AI角色存在，避免角色缺失时留下无回复的用户消息
             ai_role = await self.ai_role_service.get_role_by_id(session.ai_role_id)
             if not ai_role:
                 raise ValueError("AI角色不存在")
             
-            # 创建用户消息
-            user_message_id = await self._create_user_message(
+            # 创建用户消息，同时读取会话历史
+            user_message_id, history = await self._create_user_message(
                 chat_request.session_id,
                 chat_request.message,
                 user_id
             )
             
             # 准备AI对话上下文
-            context = await self._build_chat_context(
-                chat_request.session_id,
+            context = self._build_chat_context(
                 ai_role,
-                chat_request.context_messages
+                history,
+                chat_request.context_messages,
+                chat_request.max_context_tokens
             )
             
             # 获取AI客户端
             if not self.ai_client:
                 self.ai_client = await get_ai_client()
             
-            # 准备上下文消息
-            context_messages = []
-            if context.messages:
-                for msg in context.messages:
-                    context_messages.append({
-                        "role": msg.get("role", "user"),
-                        "content": msg.get("content", "")
-                    })
-            
             # 调用AI服务生成响应
             ai_response = await self.ai_client.generate_response(
                 content=chat_request.message,
                 ai_role=ai_role,
-                context_messages=context_messages,
+                context_messages=context.messages,
                 temperature=chat_request.temperature or 0.7,
                 max_tokens=chat_request.max_tokens or 2000
             )
@@ -367,10 +464,9 @@ class ChatService:
                 {"model": ai_response.model, "finish_reason": ai_response.finish_reason}
             )
             
-            # 更新会话统计
-            await self._update_session_stats(
+            # 更新会话token统计
+            self._update_session_stats(
                 chat_request.session_id,
-                message_count_increment=2,  # 用户消息 + AI消息
                 token_count_increment=ai_response.tokens_used
             )
             
@@ -425,81 +521,87 @@ class ChatService:
             if not session:
                 raise HTTPException(status_code=404, detail="会话不存在")
             
-            # 获取AI角色
-            ai_role = await self.ai_role_service.get_role(session.ai_role_id)
+            # 先确认AI角色存在，避免角色缺失时留下无回复的用户消息
+            ai_role = await self.ai_role_service.get_role_by_id(session.ai_role_id)
             if not ai_role:
                 raise HTTPException(status_code=404, detail="AI角色不存在")
             
-            # 创建用户消息记录
-            user_message = await self._create_message(
-                session_id=chat_request.session_id,
-                role=MessageRole.USER,
-                content=chat_request.message,
-                message_type=MessageType.TEXT
+            # 创建用户消息记录，同时读取会话历史
+            _, history = await self._create_user_message(
+                chat_request.session_id,
+                chat_request.message,
+                UUID(user_id) if user_id else None
             )
             
             # 获取对话上下文
-            context = await self._build_context(
-                session_id=chat_request.session_id,
+            context = self._build_context(
                 ai_role=ai_role,
-                limit=10
+                history=history,
+                token_budget=chat_request.max_context_tokens
             )
             
             # 获取AI客户端
             if not self.ai_client:
                 self.ai_client = await get_ai_client()
             
-            # 准备上下文消息
-            context_messages = []
-            if context.messages:
-                for msg in context.messages:
-                    context_messages.append({
-                        "role": msg.get("role", "user"),
-                        "content": msg.get("content", "")
-                    })
-            
-            # 创建AI消息记录（初始为空）
-            ai_message = await self._create_message(
-                session_id=chat_request.session_id,
-                role=MessageRole.ASSISTANT,
-                content="",
-                message_type=MessageType.TEXT
-            )
+            # AI消息ID在本地生成，流结束后一次写入
+            ai_message_id = uuid4()
             
             # 流式生成AI响应
-            full_content = ""
+            content_parts: List[str] = []
             token_count = 0
             
-            async for chunk in self.ai_client.generate_stream_response(
-                content=chat_request.message,
-                ai_role=ai_role,
-                context_messages=context_messages,
-                temperature=chat_request.temperature or 0.7,
-                max_tokens=chat_request.max_tokens or 2000
-            ):
-                if chunk.content:
-                    full_content += chunk.content
-                    token_count += chunk.token_count or 0
-                    
-                    # 返回流式响应
-                    yield StreamChatResponse(
-                        session_id=chat_request.session_id,
-                        message_id=ai_message.id,
-                        content=chunk.content,
-                        is_complete=chunk.is_final,
-                        token_count=chunk.token_count or 0,
-                        timestamp=datetime.utcnow()
-                    )
-            
-            # 更新AI消息记录
-            await self._update_message_content(ai_message.id, full_content)
-            
-            # 更新会话统计
-            await self._update_session_stats(
-                session_id=chat_request.session_id,
-                message_count=2,  # 用户消息 + AI消息
-                token_count=token_count
+            # 广播由后台任务按顺序发布，Redis较慢时不拖慢流式响应
+            publish_queue = self._start_chunk_publisher(chat_request.session_id)
+            try:
+                async for chunk in self.ai_client.generate_stream_response(
+                    content=chat_request.message,
+                    ai_role=ai_role,
+                    context_messages=context.messages,
+                    temperature=chat_request.temperature or 0.7,
+                    max_tokens=chat_request.max_tokens or 2000
+                ):
+                    if chunk.content:
+                        content_parts.append(chunk.content)
+                        token_count += chunk.token_count or 0
+                        
+                        # 返回流式响应
+                        response = StreamChatResponse(
+                            session_id=chat_request.session_id,
+                            message_id=ai_message_id,
+                            content=chunk.content,
+                            is_complete=chunk.is_final,
+                            token_count=chunk.token_count or 0,
+                            timestamp=datetime.utcnow()
+                        )
+                        yield response
+                        
+                        # 广播给同一会话的其他订阅端
+                        if publish_queue is not None:
+                            publish_queue.put_nowait(response)
+            finally:
+                if publish_queue is not None:
+                    publish_queue.put_nowait(None)
+            
+            # 创建时间和上下文缓存在生成器结束前确定，下一轮对话立即可见且顺序与数据库一致
+            content = "".join(content_parts)
+            message_data = self._build_ai_message(
+                chat_request.session_id,
+                content,
+                session.ai_role_id,
+                token_count,
+                message_id=ai_message_id
             )
+            await self._kv_append_context(chat_request.session_id, "assistant", content)
+            
+            # 后台写入AI消息和会话统计，生成器无需等待写入即可结束
+            task = asyncio.create_task(self._finalize_stream(
+                chat_request.session_id,
+                message_data,
+                token_count
+            ))
+            _finalize_tasks.add(task)
+            task.add_done_callback(_finalize_tasks.discard)
             
             self.logger.info(
                 f"流式消息处理完成 - 会话: {chat_request.session_id}, "
@@ -556,33 +658,37 @@ class ChatService:
                 limit=limit
             )
             
+            # 单次查询获取所有消息的AI角色信息
+            roles = await self.ai_role_service.get_roles_by_ids(
+                _parse_uuid(msg_data["ai_role_id"]) for msg_data in messages_data if msg_data["ai_role_id"]
+            )
+            
             # 转换为响应模型
             messages = []
             for msg_data in messages_data:
                 # 获取AI角色信息（如果是AI消息）
+                ai_role_id = _parse_uuid(msg_data["ai_role_id"]) if msg_data["ai_role_id"] else None
                 ai_role_name = None
                 ai_role_avatar = None
                 
-                if msg_data["ai_role_id"]:
-                    ai_role = await self.ai_role_service.get_role_by_id(
-                        UUID(msg_data["ai_role_id"])
-                    )
+                if ai_role_id:
+                    ai_role = roles.get(ai_role_id)
                     if ai_role:
                         ai_role_name = ai_role.name
                         ai_role_avatar = ai_role.avatar_url
                 
                 message_response = ChatMessageResponse(
-                    id=UUID(msg_data["id"]),
-                    session_id=UUID(msg_data["session_id"]),
+                    id=msg_data["id"],
+                    session_id=session_id,
                     content=msg_data["content"],
                     message_type=MessageType(msg_data["message_type"]),
-                    ai_role_id=UUID(msg_data["ai_role_id"]) if msg_data["ai_role_id"] else None,
+                    ai_role_id=ai_role_id,
                     ai_role_name=ai_role_name,
                     ai_role_avatar=ai_role_avatar,
-                    parent_message_id=UUID(msg_data["parent_message_id"]) if msg_data["parent_message_id"] else None,
+                    parent_message_id=msg_data["parent_message_id"],
                     status=MessageStatus(msg_data["status"]),
                     token_count=msg_data["token_count"] or 0,
-                    metadata=json.loads(msg_data["metadata"]) if msg_data["metadata"] else {},
+                    metadata=msg_data["metadata"] or {},
                     created_at=datetime.fromisoformat(msg_data["created_at"]),
                     updated_at=datetime.fromisoformat(msg_data["updated_at"])
                 )
@@ -600,25 +706,34 @@ class ChatService:
             self.logger.error(f"获取聊天历史失败: {str(e)}")
             return None
     
-    async def _update_message_content(self, message_id: str, content: str) -> None:
+    async def _finalize_stream(
+        self,
+        session_id: UUID,
+        message_data: Dict[str, Any],
+        token_count: int
+    ) -> None:
         """
-        更新消息内容
+        保存流式生成的AI消息并更新会话统计
+        
+        消息已在生成器结束前追加到上下文缓存，写入失败时清除缓存，下次从数据库重建
         
         Args:
-            message_id: 消息ID
-            content: 新内容
+            session_id: 会话ID
+            message_data: AI消息数据库数据
+            token_count: token数量
         """
         try:
-            query = """
-                UPDATE chat_messages 
-                SET content = $1, updated_at = NOW()
-                WHERE id = $2
-            """
-            await self.db.execute(query, content, message_id)
+            if not await self.message_writer.submit(message_data):
+                self.logger.error("保存流式消息失败 - 会话: %s, 消息: %s", session_id, message_data["id"])
+                await self._invalidate_context(session_id)
+            
+            self._update_session_stats(
+                session_id,
+                token_count_increment=token_count
+            )
             
         except Exception as e:
-            self.logger.error(f"更新消息内容失败: {str(e)}")
-            raise
+            self.logger.error("保存流式消息失败 - 会话: %s, 消息: %s, 错误: %s", session_id, message_data["id"], e)
     
     async def _validate_session(
         self, 
@@ -643,141 +758,27 @@ class ChatService:
             session_token
         )
     
-    async def _create_message(
-        self,
-        session_id: UUID,
-        role: str,
-        content: str,
-        message_type: MessageType
-    ) -> ChatMessageResponse:
-        """
-        创建消息记录
-        
-        Args:
-            session_id: 会话ID
-            role: 消息角色
-            content: 消息内容
-            message_type: 消息类型
-            
-        Returns:
-            ChatMessageResponse: 创建的消息
-        """
-        message_id = uuid4()
-        
-        message_data = {
-                "id": str(message_id),
-                "session_id": str(session_id),
-                "content": content,
-                "message_type": message_type.value,
-                "role_id": None,
-                "parent_id": None,
-                "status": MessageStatus.COMPLETED.value,
-                "tokens_used": 0,
-                "metadata": json.dumps({}),
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }
-        
-        await self.db.insert("chat_messages", message_data)
-        
-        return ChatMessageResponse(
-            id=message_id,
-            session_id=session_id,
-            parent_id=None,
-            content=content,
-            message_type=message_type,
-            role_id=None,
-            status=MessageStatus.COMPLETED,
-            tokens_used=0,
-            metadata={},
-            created_at=datetime.utcnow(),
-            role_name=None,
-            role_avatar=None
-        )
-    
-    async def _build_context(
+    def _build_context(
         self,
-        session_id: UUID,
         ai_role,
-        limit: int = 10
+        history: List[Dict[str, str]],
+        token_budget: Optional[int] = None
     ) -> ChatContext:
         """
         构建对话上下文
         
         Args:
-            session_id: 会话ID
             ai_role: AI角色
-            limit: 消息数量限制
+            history: 按时间正序排列的最近消息
+            token_budget: 历史消息token预算（可选）
             
         Returns:
             ChatContext: 对话上下文
         """
-        try:
-            # 获取最近的消息历史
-            recent_messages = await self.db.select(
-                "chat_messages",
-                filters={"session_id": str(session_id)},
-                order_by="created_at DESC",
-                limit=limit
-            )
-            
-            # 构建消息列表
-            messages = []
-            
-            # 添加历史消息（按时间正序）
-            for msg_data in reversed(recent_messages):
-                if msg_data["message_type"] == MessageType.USER.value:
-                    messages.append({
-                        "role": "user",
-                        "content": msg_data["content"]
-                    })
-                elif msg_data["message_type"] == MessageType.AI.value:
-                    messages.append({
-                        "role": "assistant",
-                        "content": msg_data["content"]
-                    })
-            
-            return ChatContext(
-                system_prompt=ai_role.system_prompt,
-                messages=messages
-            )
-            
-        except Exception as e:
-            self.logger.error(f"构建对话上下文失败: {str(e)}")
-            return ChatContext(
-                system_prompt=ai_role.system_prompt,
-                messages=[]
-            )
-    
-    async def _update_session_stats(
-        self, 
-        session_id: str, 
-        message_count: int = 0, 
-        token_count: int = 0
-    ) -> None:
-        """
-        更新会话统计信息
-        
-        Args:
-            session_id: 会话ID
-            message_count: 增加的消息数量
-            token_count: 增加的token数量
-        """
-        try:
-            query = """
-                UPDATE chat_sessions 
-                SET 
-                    message_count = message_count + $1,
-                    token_count = token_count + $2,
-                    last_message_at = NOW(),
-                    updated_at = NOW()
-                WHERE id = $3
-            """
-            await self.db.execute(query, message_count, token_count, session_id)
-            
-        except Exception as e:
-            self.logger.error(f"更新会话统计失败: {str(e)}")
-            raise
+        return ChatContext(
+            system_prompt=ai_role.system_prompt,
+            messages=self._fit_token_budget(history, token_budget)
+        )
     
     async def update_session(
         self, 
@@ -823,6 +824,7 @@ class ChatService:
             
             if not result:
                 return None
+            await self._kv_delete(f"{_SESSION_KV_PREFIX}{session_id}")
             
             # 返回更新后的会话
             return await self.get_session(session_id, user_id, session_token)
@@ -854,17 +856,13 @@ class ChatService:
             if not session:
                 return False
             
-            # 删除会话消息
-            await self.db.delete(
-                "chat_messages",
-                filters={"session_id": str(session_id)}
-            )
-            
-            # 删除会话
+            # 删除会话（会话消息由外键ON DELETE CASCADE级联删除）
             result = await self.db.delete(
                 "chat_sessions",
                 filters={"id": str(session_id)}
             )
+            await self._kv_delete(f"{_SESSION_KV_PREFIX}{session_id}")
+            await self._invalidate_context(session_id)
             
             self.logger.info(f"聊天会话删除成功: {session_id}")
             return bool(result)
@@ -878,9 +876,12 @@ class ChatService:
         session_id: UUID, 
         content: str, 
         user_id: Optional[UUID] = None
-    ) -> UUID:
+    ) -> Tuple[UUID, List[Dict[str, str]]]:
         """
-        创建用户消息
+        创建用户消息，并同时读取会话最近的消息历史
+        
+        写入与历史读取互不依赖，并发执行。历史读取排除新消息，
+        写入成功后再追加到上下文缓存，保证缓存中的消息顺序与数据库一致
         
         Args:
             session_id: 会话ID
@@ -888,9 +889,10 @@ class ChatService:
             user_id: 用户ID
             
         Returns:
-            UUID: 消息ID
+            Tuple[UUID, List[Dict[str, str]]]: 消息ID，以及末尾为新消息、按时间正序排列的最近消息
         """
         message_id = uuid4()
+        now_iso = datetime.utcnow().isoformat()
         
         message_data = {
             "id": str(message_id),
@@ -901,13 +903,22 @@ class ChatService:
             "parent_id": None,
             "status": MessageStatus.COMPLETED.value,
             "tokens_used": len(content.split()),  # 简单的token估算
-            "metadata": json.dumps({"user_id": str(user_id) if user_id else None}),
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
+            "metadata": {"user_id": str(user_id) if user_id else None},
+            "created_at": now_iso,
+            "updated_at": now_iso
         }
         
-        await self.db.insert("chat_messages", message_data)
-        return message_id
+        saved, history = await asyncio.gather(
+            self.message_writer.submit(message_data),
+            self._load_recent_messages(session_id, _CONTEXT_KV_SIZE, exclude_id=message_data["id"])
+        )
+        
+        # 只有写入成功的消息才进入上下文缓存，避免模型看到数据库中不存在的消息
+        if saved:
+            await self._kv_append_context(session_id, "user", content)
+        
+        history.append({"role": "user", "content": content})
+        return message_id, history
     
     async def _create_ai_message(
         self, 
@@ -932,46 +943,77 @@ class ChatService:
         Returns:
             UUID: 消息ID
         """
-        message_id = uuid4()
+        message_data = self._build_ai_message(
+            session_id, content, ai_role_id, token_count, metadata, status
+        )
         
-        message_data = {
-            "id": str(message_id),
+        # 只有写入成功的消息才进入上下文缓存，避免模型看到数据库中不存在的消息
+        if await self.message_writer.submit(message_data):
+            await self._kv_append_context(session_id, "assistant", content)
+        return UUID(message_data["id"])
+    
+    def _build_ai_message(
+        self,
+        session_id: UUID,
+        content: str,
+        ai_role_id: UUID,
+        token_count: int = 0,
+        metadata: Optional[Dict[str, Any]] = None,
+        status: MessageStatus = MessageStatus.COMPLETED,
+        message_id: Optional[UUID] = None
+    ) -> Dict[str, Any]:
+        """
+        构建AI消息数据，创建时间取构建时刻
+        
+        Args:
+            session_id: 会话ID
+            content: 消息内容
+            ai_role_id: AI角色ID
+            token_count: token数量
+            metadata: 元数据
+            status: 消息状态
+            message_id: 消息ID（可选，默认新生成）
+            
+        Returns:
+            Dict[str, Any]: 消息数据库数据
+        """
+        now_iso = datetime.utcnow().isoformat()
+        
+        return {
+            "id": str(message_id or uuid4()),
             "session_id": str(session_id),
             "content": content,
-            "message_type": MessageType.AI.value,
+            "message_type": MessageType.ASSISTANT.value,
             "role_id": str(ai_role_id),
             "parent_id": None,
             "status": status.value,
             "tokens_used": token_count,
-            "metadata": json.dumps(metadata or {}),
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
+            "metadata": metadata or {},
+            "created_at": now_iso,
+            "updated_at": now_iso
         }
-        
-        await self.db.insert("chat_messages", message_data)
-        return message_id
     
-    async def _create_system_message(
+    def _build_system_message(
         self, 
         session_id: UUID, 
         content: str, 
-        ai_role_id: UUID
-    ) -> UUID:
+        ai_role_id: UUID,
+        now_iso: str
+    ) -> Dict[str, Any]:
         """
-        创建系统消息
+        构建系统消息数据
         
         Args:
             session_id: 会话ID
             content: 消息内容
             ai_role_id: AI角色ID
+            now_iso: 创建时间（ISO格式）
             
         Returns:
-            UUID: 消息ID
+            Dict[str, Any]: 消息数据库数据
         """
-        message_id = uuid4()
-        
-        message_data = {
-            "id": str(message_id),
+        return {
+            "id": str(uuid4()),
             "session_id": str(session_id),
             "content": content,
             "message_type": MessageType.SYSTEM.value,
@@ -979,17 +1021,10 @@ class ChatService:
             "parent_id": None,
             "status": MessageStatus.COMPLETED.value,
             "tokens_used": 0,
-            "metadata": json.dumps({"type": "greeting"}),
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
+            "metadata": {"type": "greeting"},
+            "created_at": now_iso,
+            "updated_at": now_iso
         }
-        
-        await self.db.insert("chat_messages", message_data)
-        
-        # 更新会话消息计数
-        await self._update_session_stats(session_id, message_count_increment=1)
-        
-        return message_id
     
     async def _update_ai_message(
         self, 
@@ -1018,7 +1053,7 @@ class ChatService:
                 {
                     "content": content,
                     "tokens_used": token_count,
-                    "metadata": json.dumps(metadata),
+                    "metadata": metadata,
                     "status": status.value,
                     "updated_at": datetime.utcnow().isoformat()
                 },
@@ -1029,111 +1064,316 @@ class ChatService:
             self.logger.error(f"更新AI消息失败: {str(e)}")
             return False
     
-    async def _update_session_stats(
+    def _update_session_stats(
         self, 
         session_id: UUID, 
         message_count_increment: int = 0,
         token_count_increment: int = 0
-    ) -> bool:
+    ) -> None:
         """
         更新会话统计信息
         
+        增量先在进程内累加，由统计缓冲区定期批量写入数据库。
+        消息写入时chat_messages的插入触发器已在同一事务中累加消息数，
+        写入消息后无需再传入消息数增量
+        
         Args:
             session_id: 会话ID
             message_count_increment: 消息数增量
             token_count_increment: token数增量
-            
-        Returns:
-            bool: 更新是否成功
         """
-        try:
-            # 获取当前统计
-            result = await self.db.select(
-                "chat_sessions",
-                filters={"id": str(session_id)},
-                columns=["message_count", "total_tokens"],
-                limit=1
-            )
-            
-            if not result:
-                return False
-            
-            current_data = result[0]
-            new_message_count = (current_data["message_count"] or 0) + message_count_increment
-            new_token_count = (current_data["total_tokens"] or 0) + token_count_increment
-            
-            # 更新统计
-            update_result = await self.db.update(
-                "chat_sessions",
-                {
-                    "message_count": new_message_count,
-                    "total_tokens": new_token_count,
-                    "last_message_at": datetime.utcnow().isoformat(),
-                    "updated_at": datetime.utcnow().isoformat()
-                },
-                filters={"id": str(session_id)}
-            )
-            
-            return bool(update_result)
-            
-        except Exception as e:
-            self.logger.error(f"更新会话统计失败: {str(e)}")
-            return False
+        if message_count_increment or token_count_increment:
+            self.session_stats.add(str(session_id), message_count_increment, token_count_increment)
     
-    async def _build_chat_context(
+    def _build_chat_context(
         self, 
-        session_id: UUID, 
         ai_role, 
-        context_messages: Optional[List[Dict[str, Any]]] = None
+        history: List[Dict[str, str]],
+        context_messages: Optional[List[Dict[str, Any]]] = None,
+        token_budget: Optional[int] = None
     ) -> ChatContext:
         """
         构建聊天上下文
         
         Args:
-            session_id: 会话ID
             ai_role: AI角色
+            history: 按时间正序排列的最近消息
             context_messages: 上下文消息
+            token_budget: 历史消息token预算（可选）
             
         Returns:
             ChatContext: 聊天上下文
         """
-        try:
-            # 获取最近的消息历史
-            recent_messages = await self.db.select(
-                "chat_messages",
-                filters={"session_id": str(session_id)},
-                order_by="created_at DESC",
-                limit=10  # 最近10条消息
+        # 截取预算内的最近消息历史
+        messages = self._fit_token_budget(history, token_budget)
+        
+        # 添加自定义上下文消息，统一为role/content格式
+        if context_messages:
+            messages.extend(
+                {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+                for msg in context_messages
             )
+        
+        return ChatContext(
+            system_prompt=ai_role.system_prompt,
+            messages=messages
+        )
+    
+    def _fit_token_budget(
+        self,
+        messages: List[Dict[str, str]],
+        token_budget: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        从最新消息向前截取不超过token预算的消息
+        
+        最近一轮用户和AI消息总是保留，单条长回复不会使模型丢失全部历史
+        
+        Args:
+            messages: 按时间正序排列的消息
+            token_budget: token预算，默认使用_CONTEXT_TOKEN_BUDGET
             
-            # 构建消息列表
-            messages = []
+        Returns:
+            List[Dict[str, str]]: 按时间正序排列的预算内消息
+        """
+        remaining = _CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+        start = len(messages)
+        while start > 0:
+            remaining -= _estimate_tokens(messages[start - 1]["content"])
+            if remaining < 0 and len(messages) - start >= _CONTEXT_MIN_MESSAGES:
+                break
+            start -= 1
+        
+        return messages[start:]
+    
+    async def _load_recent_messages(
+        self,
+        session_id: UUID,
+        limit: int,
+        exclude_id: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        获取会话最近的用户和AI消息，优先读取Redis缓存
+        
+        Args:
+            session_id: 会话ID
+            limit: 消息数量限制
+            exclude_id: 需要排除的消息ID（并发写入中的新消息）
+            
+        Returns:
+            List[Dict[str, str]]: 按时间正序排列的消息
+        """
+        messages = await self._kv_get_context(session_id, limit)
+        if messages:
+            return messages
+        
+        # 只查询用户和AI消息，系统消息不占用条数限制
+        recent_messages = await self.db.select(
+            "chat_messages",
+            columns=["id", "message_type", "content"],
+            filters={"session_id": str(session_id)},
+            in_filters={"message_type": list(_CONTEXT_ROLES)},
+            order_by="created_at DESC",
+            limit=limit
+        )
+        
+        # 转换为对话消息（按时间正序）
+        messages = [
+            {"role": _CONTEXT_ROLES[msg_data["message_type"]], "content": msg_data["content"]}
+            for msg_data in reversed(recent_messages)
+            if msg_data["id"] != exclude_id
+        ]
+        
+        await self._kv_set_context(session_id, messages)
+        return messages
+    
+    async def _kv_get_context(self, session_id: UUID, limit: int) -> Optional[List[Dict[str, str]]]:
+        """
+        从Redis读取会话最近的消息，未启用Redis时读取进程内缓存，未命中或不可用时返回None
+        
+        Args:
+            session_id: 会话ID
+            limit: 消息数量限制
+            
+        Returns:
+            Optional[List[Dict[str, str]]]: 按时间正序排列的消息
+        """
+        if self.kv is None:
+            if not self.local_context:
+                return None
+            buffer = _local_context.get(str(session_id))
+            return list(buffer)[-limit:] if buffer is not None else None
+        
+        try:
+            items = await self.kv.lrange(f"{_CONTEXT_KV_PREFIX}{session_id}", 0, limit - 1)
+        except Exception as e:
+            self.logger.warning("读取Redis上下文缓存失败: %s", e)
+            return None
+        
+        return [orjson.loads(item) for item in reversed(items)]
+    
+    async def _kv_set_context(self, session_id: UUID, messages: List[Dict[str, str]]) -> None:
+        """
+        用数据库中的消息重建Redis上下文缓存，未启用Redis时重建进程内缓存
+        
+        Args:
+            session_id: 会话ID
+            messages: 按时间正序排列的消息
+        """
+        if not messages:
+            return
+        
+        if self.kv is None:
+            if self.local_context:
+                _local_context.set(str(session_id), deque(messages, maxlen=_CONTEXT_KV_SIZE))
+            return
+        
+        key = f"{_CONTEXT_KV_PREFIX}{session_id}"
+        try:
+            async with self.kv.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.lpush(key, *(orjson.dumps(message) for message in messages))
+                pipe.ltrim(key, 0, _CONTEXT_KV_SIZE - 1)
+                pipe.expire(key, _CONTEXT_KV_TTL)
+                await pipe.execute()
+        except Exception as e:
+            self.logger.warning("写入Redis上下文缓存失败: %s", e)
+    
+    async def _kv_append_context(self, session_id: UUID, role: str, content: str) -> None:
+        """
+        向已存在的上下文缓存追加一条消息
+        
+        缓存不存在时不创建，避免只含新消息的缓存掩盖数据库中的历史
+        
+        Args:
+            session_id: 会话ID
+            role: 消息角色（user/assistant）
+            content: 消息内容
+        """
+        if self.kv is None:
+            buffer = _local_context.get(str(session_id))
+            if buffer is not None:
+                buffer.append({"role": role, "content": content})
+            return
+        
+        key = f"{_CONTEXT_KV_PREFIX}{session_id}"
+        try:
+            async with self.kv.pipeline(transaction=True) as pipe:
+                pipe.lpushx(key, orjson.dumps({"role": role, "content": content}))
+                pipe.ltrim(key, 0, _CONTEXT_KV_SIZE - 1)
+                pipe.expire(key, _CONTEXT_KV_TTL)
+                await pipe.execute()
+        except Exception as e:
+            self.logger.warning("追加Redis上下文缓存失败: %s", e)
+    
+    async def _invalidate_context(self, session_id: UUID) -> None:
+        """
+        清除会话的上下文缓存，下次读取时从数据库重建
+        
+        Args:
+            session_id: 会话ID
+        """
+        _local_context.invalidate(str(session_id))
+        await self._kv_delete(f"{_CONTEXT_KV_PREFIX}{session_id}")
+    
+    async def _kv_get_session(self, session_id: UUID) -> Optional[Dict[str, Any]]:
+        """
+        从Redis读取会话记录，Redis未启用或不可用时返回None
+        
+        Args:
+            session_id: 会话ID
             
-            # 添加历史消息（按时间正序）
-            for msg_data in reversed(recent_messages):
-                if msg_data["message_type"] == MessageType.USER.value:
-                    messages.append({
-                        "role": "user",
-                        "content": msg_data["content"]
-                    })
-                elif msg_data["message_type"] == MessageType.AI.value:
-                    messages.append({
-                        "role": "assistant",
-                        "content": msg_data["content"]
-                    })
-            
-            # 添加自定义上下文消息
-            if context_messages:
-                messages.extend(context_messages)
-            
-            return ChatContext(
-                system_prompt=ai_role.system_prompt,
-                messages=messages
+        Returns:
+            Optional[Dict[str, Any]]: 会话数据库记录
+        """
+        if self.kv is None:
+            return None
+        
+        try:
+            raw = await self.kv.get(f"{_SESSION_KV_PREFIX}{session_id}")
+        except Exception as e:
+            self.logger.warning("读取Redis会话缓存失败: %s", e)
+            return None
+        
+        return orjson.loads(raw) if raw is not None else None
+    
+    async def _kv_set_session(self, session_id: UUID, session_data: Dict[str, Any]) -> None:
+        """
+        将会话记录写入Redis
+        
+        Args:
+            session_id: 会话ID
+            session_data: 会话数据库记录
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            await self.kv.set(
+                f"{_SESSION_KV_PREFIX}{session_id}",
+                orjson.dumps(session_data),
+                ex=_SESSION_KV_TTL
             )
+        except Exception as e:
+            self.logger.warning("写入Redis会话缓存失败: %s", e)
+    
+    async def _kv_delete(self, *keys: str) -> None:
+        """
+        删除Redis键
+        
+        Args:
+            *keys: Redis键
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            await self.kv.delete(*keys)
+        except Exception as e:
+            self.logger.warning("删除Redis缓存失败: %s", e)
+    
+    def _start_chunk_publisher(self, session_id: UUID) -> Optional[asyncio.Queue]:
+        """
+        启动会话频道的后台广播任务
+        
+        片段经队列由单个任务按顺序发布，发布耗时不计入流式响应；
+        向队列放入None表示流结束
+        
+        Args:
+            session_id: 会话ID
             
+        Returns:
+            Optional[asyncio.Queue]: 待广播片段队列，未启用Redis时返回None
+        """
+        if self.kv is None:
+            return None
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def publish_all() -> None:
+            while (response := await queue.get()) is not None:
+                await self._kv_publish_chunk(session_id, response)
+        
+        task = asyncio.create_task(publish_all())
+        _publish_tasks.add(task)
+        task.add_done_callback(_publish_tasks.discard)
+        return queue
+    
+    async def _kv_publish_chunk(self, session_id: UUID, response: StreamChatResponse) -> None:
+        """
+        向会话频道发布流式响应片段，其他标签页或设备可订阅该频道实时接收
+        
+        Args:
+            session_id: 会话ID
+            response: 流式响应片段
+        """
+        if self.kv is None:
+            return
+        
+        try:
+            await self.kv.publish(
+                f"{_STREAM_CHANNEL_PREFIX}{session_id}",
+                response.model_dump_json()
+            )
         except Exception as e:
-            self.logger.error(f"构建聊天上下文失败: {str(e)}")
-            return ChatContext(
-                system_prompt=ai_role.system_prompt,
-                messages=[]
-            )
\ No newline at end of file
+            self.logger.warning("发布流式响应片段失败: %s", e)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ChatGalaxy 消息批量写入模块
+
+合并并发的聊天消息写入:
+- 排队的消息以单条多行INSERT写入
+- 批量写入失败时回退为逐条写入
+- 应用关闭时写完剩余消息
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# 单次INSERT的最大消息数
+_BULK_SIZE = 50
+
+
+class MessageWriter:
+    """
+    聊天消息批量写入器
+    
+    调用方提交消息后等待所在批次写入完成；上一批写入期间到达的消息自然合并为下一批
+    """
+    
+    def __init__(self, db: DatabaseManager, bulk_size: int = _BULK_SIZE):
+        """
+        初始化批量写入器
+        
+        Args:
+            db: 数据库管理器
+            bulk_size: 单次INSERT的最大消息数
+        """
+        self.db = db
+        self.bulk_size = bulk_size
+        # 队列中的None为停止信号
+        self._queue: "asyncio.Queue[Optional[Tuple[Dict[str, Any], asyncio.Future]]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def submit(self, message_data: Dict[str, Any]) -> bool:
+        """
+        提交一条消息并等待其写入
+        
+        Args:
+            message_data: 消息数据库数据
+        
+        Returns:
+            bool: 写入是否成功
+        """
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((message_data, future))
+        # shield避免调用方取消时丢弃已排队的写入结果
+        return await asyncio.shield(future)
+    
+    async def _run(self) -> None:
+        """
+        后台写入循环，每次取出队列中已有的消息成批写入，收到停止信号后退出
+        """
+        closing = False
+        while not closing:
+            batch = []
+            item = await self._queue.get()
+            while True:
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.bulk_size or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            
+            if batch:
+                await self._flush(batch)
+    
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """
+        写入一批消息并通知等待的调用方
+        
+        Args:
+            batch: (消息数据, 结果Future)列表
+        """
+        rows = [message_data for message_data, _ in batch]
+        
+        try:
+            result = await self.db.insert_many("chat_messages", rows)
+            if result["success"]:
+                results = [True] * len(batch)
+            else:
+                # 批量写入失败时逐条写入，避免单条错误数据拖累整批
+                logger.warning("批量写入消息失败，改为逐条写入: %s", result.get("error"))
+                results = [bool(await self.db.insert("chat_messages", row)) for row in rows]
+        except Exception as e:
+            logger.error("写入消息失败: %s", e)
+            results = [False] * len(batch)
+        
+        for (_, future), success in zip(batch, results):
+            if not future.done():
+                future.set_result(success)
+    
+    async def close(self) -> None:
+        """
+        写完队列中剩余的消息并停止后台写入
+        """
+        if self._worker is not None and not self._worker.done():
+            self._queue.put_nowait(None)
+            await self._worker
+        self._worker = None
+
+
+# 全局消息写入器实例
+_message_writer: Optional[MessageWriter] = None
+
+
+def get_message_writer(db: DatabaseManager) -> MessageWriter:
+    """
+    获取消息写入器实例
+    
+    Args:
+        db: 数据库管理器
+    
+    Returns:
+        MessageWriter: 全局共享的消息写入器
+    """
+    global _message_writer
+    
+    if _message_writer is None:
+        _message_writer = MessageWriter(db)
+    
+    return _message_writer
+
+
+async def close_message_writer():
+    """
+    关闭消息写入器
+    """
+    global _message_writer
+    
+    if _message_writer is not None:
+        await _message_writer.close()
+        _message_writer = None
+        logger.info("✅ 消息写入器已关闭")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ChatGalaxy 会话统计缓冲模块
+
+合并聊天会话统计的写入:
+- 在进程内按会话累加消息数和token数
+- 定期以单次数据库调用批量写入
+- 应用关闭时写入剩余统计
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+from ..core.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# 批量写入间隔（秒）
+_FLUSH_INTERVAL = 0.1
+
+# 写入失败后的最大重试次数和最长退避间隔（秒）
+_MAX_FLUSH_RETRIES = 5
+_MAX_RETRY_DELAY = 5.0
+
+
+class SessionStatsBuffer:
+    """
+    会话统计缓冲区
+    
+    累加与写入都在同一事件循环内执行，写入前整体替换缓冲字典，无需加锁
+    """
+    
+    def __init__(self, db: DatabaseManager, flush_interval: float = _FLUSH_INTERVAL):
+        """
+        初始化统计缓冲区
+        
+        Args:
+            db: 数据库管理器
+            flush_interval: 批量写入间隔（秒）
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Tuple[int, int]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._failures = 0
+    
+    def add(self, session_id: str, message_count: int = 0, token_count: int = 0) -> None:
+        """
+        累加会话统计增量
+        
+        Args:
+            session_id: 会话ID
+            message_count: 消息数增量
+            token_count: token数增量
+        """
+        self._merge(session_id, message_count, token_count)
+        
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+    
+    async def _run(self) -> None:
+        """
+        后台写入循环，缓冲区为空时退出，下次累加时重新启动
+        
+        连续写入失败时按指数退避延长间隔
+        """
+        while self._pending:
+            delay = min(self.flush_interval * 2 ** self._failures, _MAX_RETRY_DELAY)
+            await asyncio.sleep(delay)
+            await self.flush()
+    
+    async def flush(self) -> None:
+        """
+        将缓冲的统计增量写入数据库
+        
+        失败时并回缓冲区等待重试，连续失败超过重试上限后丢弃这批增量
+        """
+        if not self._pending:
+            return
+        
+        pending, self._pending = self._pending, {}
+        stats = [
+            {"id": session_id, "message_count": message_count, "total_tokens": token_count}
+            for session_id, (message_count, token_count) in pending.items()
+        ]
+        
+        result = await self.db.rpc("apply_session_stats", {"stats": stats})
+        if result["success"]:
+            self._failures = 0
+            return
+        
+        self._failures += 1
+        if self._failures > _MAX_FLUSH_RETRIES:
+            logger.error(
+                "批量更新会话统计连续失败%d次，丢弃%d个会话的统计增量: %s",
+                self._failures, len(pending), result.get("error")
+            )
+            self._failures = 0
+            return
+        
+        logger.warning("批量更新会话统计失败，稍后重试: %s", result.get("error"))
+        for session_id, (message_count, token_count) in pending.items():
+            self._merge(session_id, message_count, token_count)
+    
+    def _merge(self, session_id: str, message_count: int, token_count: int) -> None:
+        """
+        将增量合并到缓冲区
+        
+        Args:
+            session_id: 会话ID
+            message_count: 消息数增量
+            token_count: token数增量
+        """
+        pending_messages, pending_tokens = self._pending.get(session_id, (0, 0))
+        self._pending[session_id] = (pending_messages + message_count, pending_tokens + token_count)
+    
+    async def close(self) -> None:
+        """
+        停止后台写入并写入剩余统计
+        """
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        self._flusher = None
+        
+        await self.flush()
+        if self._pending:
+            logger.error("关闭时写入会话统计失败，丢弃%d个会话的统计增量", len(self._pending))
+            self._pending = {}
+
+
+# 全局会话统计缓冲区实例
+_session_stats: Optional[SessionStatsBuffer] = None
+
+
+def get_session_stats_buffer(db: DatabaseManager) -> SessionStatsBuffer:
+    """
+    获取会话统计缓冲区实例
+    
+    Args:
+        db: 数据库管理器
+    
+    Returns:
+        SessionStatsBuffer: 全局共享的统计缓冲区
+    """
+    global _session_stats
+    
+    if _session_stats is None:
+        _session_stats = SessionStatsBuffer(db)
+    
+    return _session_stats
+
+
+async def close_session_stats_buffer():
+    """
+    关闭会话统计缓冲区
+    """
+    global _session_stats
+    
+    if _session_stats is not None:
+        await _session_stats.close()
+        _session_stats = None
+        logger.info("✅ 会话统计缓冲区已关闭")
@@ -10,13 +10,15 @@ ChatGalaxy 用户服务模块
 - 用户数据验证
 """
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Set
 from uuid import UUID, uuid4
 from datetime import datetime, timedelta
+import asyncio
 import logging
 
 from ..core.database import DatabaseManager
 from ..core.security import SecurityManager
+from ..utils.cache import TTLCache
 from ..models.user import (
     User, UserCreate, UserUpdate, UserResponse
 )
@@ -25,6 +27,60 @@ from ..models.auth import (
 )
 
 
+# 构建UserResponse所需的字段，不含password_hash等敏感或无用字段
+_USER_RESPONSE_COLUMNS = [
+    "id", "email", "username", "full_name", "avatar_url",
+    "is_active", "is_email_verified", "last_login_at", "created_at"
+]
+
+# 用户信息短期缓存，键为("id", 用户ID)或("email", 邮箱)，值为UserResponse
+# 缓存为进程内缓存，其他进程的停用等变更最长60秒后才可见，鉴权路径需绕过缓存读取
+_user_cache = TTLCache(maxsize=10000, ttl=60)
+
+
+def _cache_user(user: UserResponse) -> None:
+    """
+    按用户ID和邮箱缓存用户信息
+    
+    Args:
+        user: 用户信息
+    """
+    _user_cache.set(("id", str(user.id)), user)
+    _user_cache.set(("email", user.email), user)
+
+
+def _invalidate_user(user_id: UUID) -> None:
+    """
+    使用户信息缓存失效
+    
+    Args:
+        user_id: 用户ID
+    """
+    user = _user_cache.get(("id", str(user_id)))
+    if user is None:
+        # ID条目已淘汰时按值查找残留的邮箱条目
+        _user_cache.invalidate_values(lambda cached: str(cached.id) == str(user_id))
+        return
+    
+    _user_cache.invalidate(("id", str(user_id)))
+    _user_cache.invalidate(("email", user.email))
+
+
+# 最近已写入登录时间的用户，同一用户每分钟最多写入一次
+_last_login_written = TTLCache(maxsize=10000, ttl=60)
+
+# 后台执行中的登录时间更新任务，持有引用避免任务被回收
+_last_login_tasks: Set[asyncio.Task] = set()
+
+
+async def flush_last_login_updates():
+    """
+    等待后台执行中的登录时间更新完成
+    """
+    if _last_login_tasks:
+        await asyncio.gather(*_last_login_tasks, return_exceptions=True)
+
+
 class UserService:
     """
     用户服务类
@@ -63,22 +119,25 @@ class UserService:
             if user_data.password != user_data.confirm_password:
                 raise ValueError("密码和确认密码不一致")
             
-            # 检查邮箱是否已存在
-            existing_user = await self.get_user_by_email(user_data.email)
-            if existing_user:
+            # 单次查询检查邮箱和用户名是否已存在
+            existing_users = await self.db.select(
+                "users",
+                columns=["email", "username"],
+                or_filters={"email": user_data.email, "username": user_data.username},
+                limit=2
+            )
+            if any(row["email"] == user_data.email for row in existing_users):
                 raise ValueError("邮箱已被注册")
-            
-            # 检查用户名是否已存在
-            existing_username = await self.get_user_by_username(user_data.username)
-            if existing_username:
+            if any(row["username"] == user_data.username for row in existing_users):
                 raise ValueError("用户名已被使用")
             
             # 加密密码
-            password_hash = self.security.hash_password(user_data.password)
+            password_hash = await self.security.hash_password_async(user_data.password)
             
             # 准备用户数据
             user_id = uuid4()
             now = datetime.utcnow()
+            now_iso = now.isoformat()
             
             user_dict = {
                 "id": str(user_id),
@@ -89,8 +148,8 @@ class UserService:
                 "password_hash": password_hash,
                 "is_active": True,
                 "is_email_verified": False,
-                "created_at": now.isoformat(),
-                "updated_at": now.isoformat()
+                "created_at": now_iso,
+                "updated_at": now_iso
             }
             
             # 插入数据库
@@ -108,7 +167,7 @@ class UserService:
                 full_name=user_data.full_name,
                 avatar_url=user_data.avatar_url,
                 is_active=True,
-                is_email_verified=False,
+                email_verified=False,
                 last_login_at=None,
                 created_at=now
             )
@@ -119,28 +178,36 @@ class UserService:
             self.logger.error(f"用户创建失败: {str(e)}")
             raise Exception(f"用户创建失败: {str(e)}")
     
-    async def get_user_by_id(self, user_id: UUID) -> Optional[UserResponse]:
+    async def get_user_by_id(self, user_id: UUID, use_cache: bool = True) -> Optional[UserResponse]:
         """
         根据用户ID获取用户信息
         
         Args:
             user_id: 用户ID
+            use_cache: 是否读取进程内缓存，鉴权时传False以获取最新的is_active状态
             
         Returns:
             Optional[UserResponse]: 用户信息，不存在则返回None
         """
+        if use_cache:
+            cached = _user_cache.get(("id", str(user_id)))
+            if cached is not None:
+                return cached
+        
         try:
             result = await self.db.select(
                 "users",
                 filters={"id": str(user_id)},
+                columns=_USER_RESPONSE_COLUMNS,
                 limit=1
             )
             
             if not result:
                 return None
             
-            user_data = result[0]
-            return self._convert_to_user_response(user_data)
+            user = self._convert_to_user_response(result[0])
+            _cache_user(user)
+            return user
             
         except Exception as e:
             self.logger.error(f"获取用户失败: {str(e)}")
@@ -156,10 +223,44 @@ class UserService:
         Returns:
             Optional[UserResponse]: 用户信息，不存在则返回None
         """
+        cached = _user_cache.get(("email", email))
+        if cached is not None:
+            return cached
+        
         try:
             result = await self.db.select(
                 "users",
                 filters={"email": email},
+                columns=_USER_RESPONSE_COLUMNS,
+                limit=1
+            )
+            
+            if not result:
+                return None
+            
+            user = self._convert_to_user_response(result[0])
+            _cache_user(user)
+            return user
+            
+        except Exception as e:
+            self.logger.error(f"获取用户失败: {str(e)}")
+            return None
+    
+    async def get_user_with_credentials(self, email: str) -> Optional[Tuple[UserResponse, str]]:
+        """
+        根据邮箱获取用户信息及密码哈希（单次查询，用于登录）
+        
+        Args:
+            email: 邮箱地址
+            
+        Returns:
+            Optional[Tuple[UserResponse, str]]: 用户信息和密码哈希，不存在则返回None
+        """
+        try:
+            result = await self.db.select(
+                "users",
+                filters={"email": email},
+                columns=_USER_RESPONSE_COLUMNS + ["password_hash"],
                 limit=1
             )
             
@@ -167,7 +268,7 @@ class UserService:
                 return None
             
             user_data = result[0]
-            return self._convert_to_user_response(user_data)
+            return self._convert_to_user_response(user_data), user_data["password_hash"]
             
         except Exception as e:
             self.logger.error(f"获取用户失败: {str(e)}")
@@ -187,6 +288,7 @@ class UserService:
             result = await self.db.select(
                 "users",
                 filters={"username": username},
+                columns=_USER_RESPONSE_COLUMNS,
                 limit=1
             )
             
@@ -238,8 +340,6 @@ class UserService:
             if not update_dict:
                 return existing_user
             
-            update_dict["updated_at"] = datetime.utcnow().isoformat()
-            
             # 更新数据库
             result = await self.db.update(
                 "users",
@@ -250,6 +350,7 @@ class UserService:
             if not result:
                 raise Exception("用户更新失败")
             
+            _invalidate_user(user_id)
             self.logger.info(f"用户更新成功: {user_id}")
             
             # 返回更新后的用户信息
@@ -261,6 +362,24 @@ class UserService:
             self.logger.error(f"用户更新失败: {str(e)}")
             raise Exception(f"用户更新失败: {str(e)}")
     
+    def schedule_last_login_update(self, user_id: UUID) -> None:
+        """
+        在后台更新用户最后登录时间，不阻塞登录流程
+        
+        同一用户一分钟内重复登录时只写入一次
+        
+        Args:
+            user_id: 用户ID
+        """
+        key = str(user_id)
+        if key in _last_login_written:
+            return
+        _last_login_written.set(key, True)
+        
+        task = asyncio.create_task(self.update_last_login(user_id))
+        _last_login_tasks.add(task)
+        task.add_done_callback(_last_login_tasks.discard)
+    
     async def update_last_login(self, user_id: UUID) -> bool:
         """
         更新用户最后登录时间
@@ -275,12 +394,12 @@ class UserService:
             result = await self.db.update(
                 "users",
                 {
-                    "last_login_at": datetime.utcnow().isoformat(),
-                    "updated_at": datetime.utcnow().isoformat()
+                    "last_login_at": datetime.utcnow().isoformat()
                 },
                 filters={"id": str(user_id)}
             )
             
+            _invalidate_user(user_id)
             return bool(result)
             
         except Exception as e:
@@ -301,12 +420,12 @@ class UserService:
             result = await self.db.update(
                 "users",
                 {
-                    "is_email_verified": True,
-                    "updated_at": datetime.utcnow().isoformat()
+                    "is_email_verified": True
                 },
                 filters={"id": str(user_id)}
             )
             
+            _invalidate_user(user_id)
             if result:
                 self.logger.info(f"邮箱验证成功: {user_id}")
             
@@ -330,12 +449,12 @@ class UserService:
             result = await self.db.update(
                 "users",
                 {
-                    "is_active": False,
-                    "updated_at": datetime.utcnow().isoformat()
+                    "is_active": False
                 },
                 filters={"id": str(user_id)}
             )
             
+            _invalidate_user(user_id)
             if result:
                 self.logger.info(f"用户停用成功: {user_id}")
             
@@ -361,25 +480,14 @@ class UserService:
             if not user:
                 return {}
             
-            # 获取聊天会话数量
-            sessions_result = await self.db.select(
-                "chat_sessions",
-                filters={"user_id": str(user_id)},
-                count_only=True
-            )
-            session_count = sessions_result[0].get("count", 0) if sessions_result else 0
-            
-            # 获取消息数量
-            messages_result = await self.db.execute_query(
-                """
-                SELECT COUNT(*) as count
-                FROM chat_messages cm
-                JOIN chat_sessions cs ON cm.session_id = cs.id
-                WHERE cs.user_id = %s AND cm.message_type = 'user'
-                """,
-                (str(user_id),)
+            # 复用已有的get_user_chat_stats函数，单次聚合会话表计数器
+            stats_result = await self.db.rpc(
+                "get_user_chat_stats",
+                {"user_uuid": str(user_id)}
             )
-            message_count = messages_result[0].get("count", 0) if messages_result else 0
+            stats = stats_result["data"][0] if stats_result["success"] and stats_result["data"] else {}
+            session_count = stats.get("total_sessions", 0)
+            message_count = stats.get("total_messages", 0)
             
             return {
                 "user_id": str(user_id),
@@ -388,7 +496,7 @@ class UserService:
                 "session_count": session_count,
                 "message_count": message_count,
                 "is_active": user.is_active,
-                "is_email_verified": user.is_email_verified,
+                "is_email_verified": user.email_verified,
                 "created_at": user.created_at,
                 "last_login_at": user.last_login_at
             }
@@ -414,7 +522,7 @@ class UserService:
             full_name=user_data.get("full_name"),
             avatar_url=user_data.get("avatar_url"),
             is_active=user_data["is_active"],
-            is_email_verified=user_data["is_email_verified"],
+            email_verified=user_data["is_email_verified"],
             last_login_at=datetime.fromisoformat(user_data["last_login_at"]) if user_data.get("last_login_at") else None,
             created_at=datetime.fromisoformat(user_data["created_at"])
         )
\ No newline at end of file
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ChatGalaxy 缓存工具模块
+
+提供进程内缓存功能:
+- LRU淘汰策略
+- 条目过期时间(TTL)
+- 单条和批量失效
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+# 区分"未命中"与缓存值为None
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    带过期时间的LRU缓存
+    
+    仅用于单个事件循环内的进程级缓存，读写均为同步操作
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        """
+        初始化缓存
+        
+        Args:
+            maxsize: 最大条目数
+            ttl: 条目有效期（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        获取缓存值
+        
+        Args:
+            key: 缓存键
+            default: 未命中或已过期时的返回值
+        
+        Returns:
+            Any: 缓存值
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存值
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 单独指定的有效期（秒），默认使用缓存的ttl
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def invalidate(self, key: Hashable) -> None:
+        """
+        使单个缓存条目失效
+        
+        Args:
+            key: 缓存键
+        """
+        self._data.pop(key, None)
+    
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """
+        使满足条件的缓存条目失效
+        
+        Args:
+            predicate: 以缓存键为参数的判断函数
+        """
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+    
+    def invalidate_values(self, predicate: Callable[[Any], bool]) -> None:
+        """
+        使缓存值满足条件的缓存条目失效
+        
+        Args:
+            predicate: 以缓存值为参数的判断函数
+        """
+        for key in [key for key, (_, value) in self._data.items() if predicate(value)]:
+            del self._data[key]
+    
+    def clear(self) -> None:
+        """
+        清空缓存
+        """
+        self._data.clear()
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户服务测试
+
+覆盖注册时邮箱、用户名重复检查的查询参数和分支
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.database import DatabaseManager
+from app.models.user import UserCreate
+from app.services.user_service import UserService
+
+
+class RecordingQuery:
+    """记录链式调用的PostgREST查询替身"""
+    
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.rows = []
+    
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.client.calls.append((self.table, name, args))
+            if name == "select":
+                self.rows = list(self.client.existing_rows)
+            elif name == "insert":
+                self.client.inserted.append(args[0])
+                self.rows = [args[0]]
+            return self
+        return method
+    
+    def execute(self):
+        return SimpleNamespace(data=self.rows, count=None)
+
+
+class RecordingClient:
+    """返回预置行并记录调用的Supabase客户端替身"""
+    
+    def __init__(self, existing_rows=None):
+        self.existing_rows = existing_rows or []
+        self.calls = []
+        self.inserted = []
+    
+    def table(self, name):
+        return RecordingQuery(self, name)
+
+
+class FakeSecurity:
+    """跳过真实哈希计算的安全管理器替身"""
+    
+    async def hash_password_async(self, password):
+        return f"hashed:{password}"
+
+
+def _service(existing_rows=None):
+    client = RecordingClient(existing_rows)
+    db = DatabaseManager()
+    db._client = client
+    return UserService(db, FakeSecurity()), client
+
+
+def _user_create(**overrides):
+    data = {
+        "email": "alice.smith@example.com",
+        "username": "alice",
+        "password": "secret123",
+        "confirm_password": "secret123"
+    }
+    data.update(overrides)
+    return UserCreate(**data)
+
+
+def test_create_user_checks_email_and_username_with_quoted_or_filter():
+    service, client = _service()
+    
+    user = asyncio.run(service.create_user(_user_create()))
+    
+    or_calls = [args for _, name, args in client.calls if name == "or_"]
+    assert or_calls == [('email.eq."alice.smith@example.com",username.eq."alice"',)]
+    assert user.username == "alice"
+    assert user.email_verified is False
+    assert client.inserted[0]["password_hash"] == "hashed:secret123"
+
+
+def test_create_user_rejects_duplicate_email():
+    service, client = _service([{"email": "alice.smith@example.com", "username": "someone"}])
+    
+    with pytest.raises(ValueError, match="邮箱已被注册"):
+        asyncio.run(service.create_user(_user_create()))
+    assert client.inserted == []
+
+
+def test_create_user_rejects_duplicate_username():
+    service, client = _service([{"email": "bob@example.com", "username": "alice"}])
+    
+    with pytest.raises(ValueError, match="用户名已被使用"):
+        asyncio.run(service.create_user(_user_create()))
+    assert client.inserted == []
@@ -0,0 +1,16 @@
+-- ChatGalaxy AI聊天平台 - AI角色使用次数函数
+-- 创建时间: 2026-10-16
+-- 描述: 以单条UPDATE原子地增加角色使用次数
+
+-- 创建数据库函数：增加角色使用次数
+CREATE OR REPLACE FUNCTION increment_role_usage(role_uuid UUID)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE ai_roles
+    SET usage_count = COALESCE(usage_count, 0) + 1,
+        updated_at = NOW()
+    WHERE id = role_uuid;
+    
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -0,0 +1,25 @@
+-- ChatGalaxy AI聊天平台 - AI角色统计函数
+-- 创建时间: 2026-10-16
+-- 描述: 以单次聚合查询获取AI角色的会话统计
+
+-- 创建数据库函数：获取AI角色会话统计
+CREATE OR REPLACE FUNCTION get_ai_role_stats(role_uuid UUID)
+RETURNS TABLE(
+    total_sessions INTEGER,
+    active_sessions INTEGER,
+    total_messages INTEGER,
+    total_tokens INTEGER,
+    last_used_at TIMESTAMP WITH TIME ZONE
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        COUNT(*)::INTEGER as total_sessions,
+        (COUNT(*) FILTER (WHERE cs.is_active))::INTEGER as active_sessions,
+        COALESCE(SUM(cs.message_count), 0)::INTEGER as total_messages,
+        COALESCE(SUM(cs.total_tokens), 0)::INTEGER as total_tokens,
+        MAX(cs.updated_at) as last_used_at
+    FROM chat_sessions cs
+    WHERE cs.ai_role_id = role_uuid;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
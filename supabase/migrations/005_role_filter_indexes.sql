@@ -0,0 +1,17 @@
+-- ChatGalaxy AI聊天平台 - AI角色查询索引
+-- 创建时间: 2026-10-16
+-- 描述: 补齐AI角色服务使用的过滤字段，并为其添加复合索引
+
+-- 补齐ai_roles表的角色类型和默认角色字段（AIRoleService按此过滤）
+ALTER TABLE ai_roles ADD COLUMN IF NOT EXISTS role_type VARCHAR(20) NOT NULL DEFAULT 'assistant';
+ALTER TABLE ai_roles ADD COLUMN IF NOT EXISTS is_default BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- 补齐chat_sessions表的ai_role_id字段（ChatService按此写入），并从role_id回填
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS ai_role_id UUID REFERENCES ai_roles(id);
+UPDATE chat_sessions SET ai_role_id = role_id WHERE ai_role_id IS NULL AND role_id IS NOT NULL;
+
+-- AI角色表索引（get_roles / get_default_roles / _clear_default_roles）
+CREATE INDEX IF NOT EXISTS idx_ai_roles_type_default_active ON ai_roles(role_type, is_default, is_active);
+
+-- 聊天会话表索引（delete_role的使用中检查 / get_ai_role_stats）
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_role_active ON chat_sessions(ai_role_id, is_active);
@@ -0,0 +1,32 @@
+-- ChatGalaxy AI聊天平台 - AI角色统计物化视图
+-- 创建时间: 2026-10-16
+-- 描述: 预先聚合AI角色的会话统计，由pg_cron每分钟刷新
+
+-- 启用定时任务扩展
+CREATE EXTENSION IF NOT EXISTS pg_cron;
+
+-- 补齐chat_sessions表的token累计字段（ai_role_id由005迁移添加）
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS total_tokens INTEGER NOT NULL DEFAULT 0;
+
+-- 创建物化视图：AI角色会话统计
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_ai_role_stats AS
+SELECT 
+    cs.ai_role_id as role_id,
+    COUNT(*)::INTEGER as total_sessions,
+    (COUNT(*) FILTER (WHERE cs.is_active))::INTEGER as active_sessions,
+    COALESCE(SUM(cs.message_count), 0)::INTEGER as total_messages,
+    COALESCE(SUM(cs.total_tokens), 0)::INTEGER as total_tokens,
+    MAX(cs.updated_at) as last_used_at
+FROM chat_sessions cs
+WHERE cs.ai_role_id IS NOT NULL
+GROUP BY cs.ai_role_id;
+
+-- 并发刷新需要唯一索引
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_ai_role_stats_role ON mv_ai_role_stats(role_id);
+
+-- 每分钟刷新一次
+SELECT cron.schedule(
+    'refresh_mv_ai_role_stats',
+    '* * * * *',
+    'REFRESH MATERIALIZED VIEW CONCURRENTLY mv_ai_role_stats'
+);
@@ -0,0 +1,22 @@
+-- ChatGalaxy AI聊天平台 - AI角色删除检查函数
+-- 创建时间: 2026-10-16
+-- 描述: 以单次查询检查AI角色是否存在及是否正在使用
+
+-- 创建数据库函数：获取AI角色的删除前状态
+CREATE OR REPLACE FUNCTION get_role_delete_state(role_uuid UUID)
+RETURNS TABLE(
+    name VARCHAR,
+    in_use BOOLEAN
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        r.name,
+        EXISTS (
+            SELECT 1 FROM chat_sessions cs
+            WHERE cs.ai_role_id = r.id AND cs.is_active = true
+        ) as in_use
+    FROM ai_roles r
+    WHERE r.id = role_uuid;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
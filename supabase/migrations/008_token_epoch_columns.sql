@@ -0,0 +1,45 @@
+-- ChatGalaxy AI聊天平台 - 令牌表（Unix时间戳时间字段）
+-- 创建时间: 2026-10-16
+-- 描述: 创建verification_tokens和refresh_tokens表，时间字段为BIGINT（Unix时间戳，秒）；已有表的TIMESTAMP字段就地转换
+
+-- 验证令牌表（邮箱验证 / 密码重置）
+CREATE TABLE IF NOT EXISTS verification_tokens (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token VARCHAR(255) UNIQUE NOT NULL,
+    token_type VARCHAR(50) NOT NULL,
+    expires_at BIGINT NOT NULL,
+    created_at BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM NOW())::BIGINT
+);
+
+-- 刷新令牌表
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token TEXT NOT NULL,
+    expires_at BIGINT NOT NULL,
+    created_at BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM NOW())::BIGINT
+);
+
+-- 令牌表仅供后端服务访问
+ALTER TABLE verification_tokens ENABLE ROW LEVEL SECURITY;
+ALTER TABLE refresh_tokens ENABLE ROW LEVEL SECURITY;
+
+-- 已有表的时间字段仍为TIMESTAMP时，转换为Unix时间戳
+DO $$ BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'verification_tokens' AND column_name = 'expires_at' AND data_type <> 'bigint') THEN
+        ALTER TABLE verification_tokens
+            ALTER COLUMN expires_at TYPE BIGINT USING EXTRACT(EPOCH FROM expires_at)::BIGINT,
+            ALTER COLUMN created_at DROP DEFAULT,
+            ALTER COLUMN created_at TYPE BIGINT USING EXTRACT(EPOCH FROM created_at)::BIGINT,
+            ALTER COLUMN created_at SET DEFAULT EXTRACT(EPOCH FROM NOW())::BIGINT;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'refresh_tokens' AND column_name = 'expires_at' AND data_type <> 'bigint') THEN
+        ALTER TABLE refresh_tokens
+            ALTER COLUMN expires_at TYPE BIGINT USING EXTRACT(EPOCH FROM expires_at)::BIGINT,
+            ALTER COLUMN created_at DROP DEFAULT,
+            ALTER COLUMN created_at TYPE BIGINT USING EXTRACT(EPOCH FROM created_at)::BIGINT,
+            ALTER COLUMN created_at SET DEFAULT EXTRACT(EPOCH FROM NOW())::BIGINT;
+    END IF;
+END $$;
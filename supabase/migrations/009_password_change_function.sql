@@ -0,0 +1,29 @@
+-- ChatGalaxy AI聊天平台 - 密码修改函数
+-- 创建时间: 2026-10-16
+-- 描述: 在同一事务内更新密码并清除重置令牌和刷新令牌
+
+-- 创建数据库函数：更新用户密码并使已有会话失效
+CREATE OR REPLACE FUNCTION apply_password_change(
+    user_uuid UUID,
+    new_password_hash VARCHAR,
+    reset_token VARCHAR DEFAULT NULL
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE users
+    SET password_hash = new_password_hash
+    WHERE id = user_uuid;
+    
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+    
+    IF reset_token IS NOT NULL THEN
+        DELETE FROM verification_tokens WHERE token = reset_token;
+    END IF;
+    
+    DELETE FROM refresh_tokens WHERE user_id = user_uuid;
+    
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
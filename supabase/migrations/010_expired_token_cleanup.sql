@@ -0,0 +1,28 @@
+-- ChatGalaxy AI聊天平台 - 过期令牌清理
+-- 创建时间: 2026-10-16
+-- 描述: 由pg_cron每5分钟批量删除过期的验证令牌和刷新令牌
+
+-- 启用定时任务扩展
+CREATE EXTENSION IF NOT EXISTS pg_cron;
+
+-- 按过期时间删除需要的索引
+CREATE INDEX IF NOT EXISTS idx_verification_tokens_expires_at ON verification_tokens(expires_at);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires_at ON refresh_tokens(expires_at);
+
+-- 创建数据库函数：删除过期令牌
+CREATE OR REPLACE FUNCTION delete_expired_tokens()
+RETURNS VOID AS $$
+DECLARE
+    now_epoch BIGINT := EXTRACT(EPOCH FROM NOW())::BIGINT;
+BEGIN
+    DELETE FROM verification_tokens WHERE expires_at < now_epoch;
+    DELETE FROM refresh_tokens WHERE expires_at < now_epoch;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 每5分钟清理一次
+SELECT cron.schedule(
+    'delete_expired_tokens',
+    '*/5 * * * *',
+    'SELECT delete_expired_tokens()'
+);
@@ -0,0 +1,16 @@
+-- ChatGalaxy AI聊天平台 - 刷新令牌摘要列
+-- 创建时间: 2026-10-16
+-- 描述: 为refresh_tokens增加定长摘要列，按摘要而非完整JWT查找令牌
+
+-- 令牌摘要：SHA-256前16字节的十六进制表示
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS token_hash CHAR(32);
+
+-- 回填已有令牌
+UPDATE refresh_tokens
+SET token_hash = encode(substring(sha256(convert_to(token, 'UTF8')) FROM 1 FOR 16), 'hex')
+WHERE token_hash IS NULL;
+
+ALTER TABLE refresh_tokens ALTER COLUMN token_hash SET NOT NULL;
+
+-- 按用户和摘要查找令牌
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_hash ON refresh_tokens(user_id, token_hash);
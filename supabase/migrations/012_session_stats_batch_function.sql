@@ -0,0 +1,18 @@
+-- ChatGalaxy AI聊天平台 - 会话统计批量更新函数
+-- 创建时间: 2026-10-16
+-- 描述: 以单条UPDATE累加多个会话的消息数和token数
+
+-- 创建数据库函数：批量累加会话统计
+-- stats格式: [{"id": "<会话ID>", "message_count": 2, "total_tokens": 120}, ...]
+CREATE OR REPLACE FUNCTION apply_session_stats(stats JSONB)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE chat_sessions s
+    SET 
+        message_count = COALESCE(s.message_count, 0) + v.message_count,
+        total_tokens = COALESCE(s.total_tokens, 0) + v.total_tokens,
+        last_message_at = NOW()
+    FROM jsonb_to_recordset(stats) AS v(id UUID, message_count INTEGER, total_tokens INTEGER)
+    WHERE s.id = v.id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
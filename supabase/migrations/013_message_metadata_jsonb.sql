@@ -0,0 +1,19 @@
+-- ChatGalaxy AI聊天平台 - 消息元数据JSONB列
+-- 创建时间: 2026-10-16
+-- 描述: chat_messages.metadata使用JSONB存储，读写时由数据库直接处理JSON
+
+-- 已有文本类型的元数据列转换为JSONB
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns 
+               WHERE table_name = 'chat_messages' AND column_name = 'metadata' 
+               AND data_type <> 'jsonb') THEN
+        ALTER TABLE chat_messages ALTER COLUMN metadata TYPE JSONB USING COALESCE(NULLIF(metadata::TEXT, ''), '{}')::JSONB;
+    END IF;
+END $$;
+
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS metadata JSONB;
+
+UPDATE chat_messages SET metadata = '{}'::JSONB WHERE metadata IS NULL;
+ALTER TABLE chat_messages ALTER COLUMN metadata SET DEFAULT '{}'::JSONB;
+ALTER TABLE chat_messages ALTER COLUMN metadata SET NOT NULL;
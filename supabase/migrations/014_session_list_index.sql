@@ -0,0 +1,6 @@
+-- ChatGalaxy AI聊天平台 - 用户会话列表索引
+-- 创建时间: 2026-10-16
+-- 描述: 按用户和更新时间倒序索引会话，匹配会话列表的排序
+
+-- 用户会话列表: WHERE user_id = ? ORDER BY updated_at DESC
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_updated ON chat_sessions(user_id, updated_at DESC);
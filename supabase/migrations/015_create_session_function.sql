@@ -0,0 +1,35 @@
+-- ChatGalaxy AI聊天平台 - 创建会话函数
+-- 创建时间: 2026-10-16
+-- 描述: 在同一事务中创建会话、写入欢迎消息并增加角色使用次数
+
+-- 创建数据库函数：创建聊天会话
+-- session: 会话记录JSON；greeting: 欢迎消息记录JSON，无欢迎消息时为NULL
+CREATE OR REPLACE FUNCTION create_chat_session(session JSONB, greeting JSONB DEFAULT NULL)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO chat_sessions (
+        id, title, ai_role_id, user_id, session_token, is_active, session_status,
+        message_count, total_tokens, last_message_at, created_at, updated_at
+    )
+    SELECT 
+        id, title, ai_role_id, user_id, session_token, is_active, session_status,
+        message_count, total_tokens, last_message_at, created_at, updated_at
+    FROM jsonb_populate_record(NULL::chat_sessions, session);
+    
+    IF greeting IS NOT NULL THEN
+        INSERT INTO chat_messages (
+            id, session_id, content, message_type, role_id, parent_id, status,
+            tokens_used, metadata, created_at, updated_at
+        )
+        SELECT 
+            id, session_id, content, message_type, role_id, parent_id, status,
+            tokens_used, metadata, created_at, updated_at
+        FROM jsonb_populate_record(NULL::chat_messages, greeting);
+    END IF;
+    
+    UPDATE ai_roles
+    SET usage_count = COALESCE(usage_count, 0) + 1,
+        updated_at = NOW()
+    WHERE id = (session->>'ai_role_id')::UUID;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;